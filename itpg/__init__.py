@@ -4,6 +4,7 @@
 
 from ._version import __version__
 
+from .backend import set_backend, get_backend
 from . import entropy
 from . import connectivity
 from . import data
@@ -0,0 +1,5 @@
+"""Array backends of the entropy and O-info kernels."""
+# Authors: Christian Ferreyra, chrisferreyra13@gmail.com
+# License: MIT License
+
+from .backend import set_backend, get_backend, get_kernel, BACKENDS
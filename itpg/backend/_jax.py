@@ -0,0 +1,69 @@
+"""Jax kernels of the log-determinant and O-info."""
+# Authors: Christian Ferreyra, chrisferreyra13@gmail.com
+# Date: 2023
+# License: MIT License
+
+import numpy as np
+import jax
+import jax.numpy as jnp
+from jax.scipy.linalg import solve_triangular
+
+jax.config.update('jax_enable_x64', True)
+
+
+@jax.jit
+def _logdet(c):
+    """Log-determinants of matrices (..., n, n), NaN if not positive."""
+    chc = jnp.linalg.cholesky(c)
+    return 2. * jnp.log(jnp.diagonal(chc, axis1=-2, axis2=-1)).sum(-1)
+
+
+@jax.jit
+def _oinfo_chol(c):
+    """O-info of covariances (..., n, n) from a single cholesky."""
+    chc = jnp.linalg.cholesky(c)
+    logdet = 2. * jnp.log(jnp.diagonal(chc, axis1=-2, axis2=-1)).sum(-1)
+    eye = jnp.broadcast_to(jnp.eye(c.shape[-1], dtype=c.dtype), c.shape)
+    chc_inv = solve_triangular(chc, eye, lower=True)
+    prec_diag = (chc_inv ** 2).sum(-2)
+    c_diag = jnp.diagonal(c, axis1=-2, axis2=-1)
+    return 0.5 * (jnp.log(c_diag) - jnp.log(prec_diag)).sum(-1) - logdet
+
+
+@jax.jit
+def _oinfo_batch(c, mult):
+    """O-info of multiplets (n_mult, k) from covariances (n_times, n, n)."""
+    return _oinfo_chol(c[:, mult[:, :, None], mult[:, None, :]])
+
+
+def _bucket(n):
+    """Next power of two, so that few batch sizes are compiled."""
+    return 1 << max(int(n) - 1, 0).bit_length()
+
+
+def _padded(func):
+    """Apply a kernel to a batch (n_batch, n, n) padded to a bucket size."""
+    def _func(c):
+        n, shape = c.shape[-1], c.shape[:-2]
+        c = c.reshape(-1, n, n)
+        n_batch = len(c)
+        pad = np.broadcast_to(np.eye(n, dtype=c.dtype),
+                              (_bucket(n_batch) - n_batch, n, n))
+        out = np.asarray(func(np.concatenate((c, pad))))[:n_batch]
+        return out.reshape(shape)
+    return _func
+
+
+def _oinfo_batch_padded(c, mult):
+    """O-info of a batch of multiplets padded to a bucket size."""
+    n_mult = len(mult)
+    pad = np.repeat(mult[:1], _bucket(n_mult) - n_mult, axis=0)
+    return np.asarray(_oinfo_batch(c, np.concatenate((mult, pad))))[
+        :, :n_mult]
+
+
+KERNELS = {
+    'logdet': _padded(_logdet),
+    'oinfo_chol': _padded(_oinfo_chol),
+    'oinfo_batch': _oinfo_batch_padded,
+}
@@ -0,0 +1,111 @@
+"""Numba kernels of the log-determinant and O-info."""
+# Authors: Christian Ferreyra, chrisferreyra13@gmail.com
+# Date: 2023
+# License: MIT License
+
+import numpy as np
+from numba import njit
+
+
+@njit(cache=True)
+def _chol(a, lo):
+    """Cholesky factor of a into lo, returns the log-determinant of a.
+
+    The log-determinant is NaN if a is not positive definite.
+    """
+    n = a.shape[0]
+    logdet = 0.
+    for j in range(n):
+        s = a[j, j]
+        for k in range(j):
+            s -= lo[j, k] * lo[j, k]
+        if not s > 0:
+            return np.nan
+        lo[j, j] = np.sqrt(s)
+        logdet += np.log(s)
+        for i in range(j + 1, n):
+            s = a[i, j]
+            for k in range(j):
+                s -= lo[i, k] * lo[j, k]
+            lo[i, j] = s / lo[j, j]
+    return logdet
+
+
+@njit(cache=True)
+def _oinfo_one(a, lo, lo_inv):
+    """O-info of a covariance a from a single cholesky factorization."""
+    n = a.shape[0]
+    logdet = _chol(a, lo)
+    if np.isnan(logdet):
+        return np.nan
+    # inverse of the cholesky factor by forward substitution
+    for j in range(n):
+        lo_inv[j, j] = 1. / lo[j, j]
+        for i in range(j + 1, n):
+            s = 0.
+            for k in range(j, i):
+                s -= lo[i, k] * lo_inv[k, j]
+            lo_inv[i, j] = s / lo[i, i]
+    # O = 0.5 * sum_j(log(c_jj) - log(inv(c)_jj)) - log|c|
+    o = -logdet
+    for j in range(n):
+        prec = 0.
+        for i in range(j, n):
+            prec += lo_inv[i, j] * lo_inv[i, j]
+        o += 0.5 * (np.log(a[j, j]) - np.log(prec))
+    return o
+
+
+@njit(cache=True)
+def _logdet(c):
+    """Log-determinants of a batch of matrices (n_batch, n, n)."""
+    n_batch, n = c.shape[0], c.shape[1]
+    out = np.empty(n_batch)
+    lo = np.zeros((n, n))
+    for b in range(n_batch):
+        out[b] = _chol(c[b], lo)
+    return out
+
+
+@njit(cache=True)
+def _oinfo_chol(c):
+    """O-info of a batch of covariances (n_batch, n, n)."""
+    n_batch, n = c.shape[0], c.shape[1]
+    out = np.empty(n_batch)
+    lo, lo_inv = np.zeros((n, n)), np.zeros((n, n))
+    for b in range(n_batch):
+        out[b] = _oinfo_one(c[b], lo, lo_inv)
+    return out
+
+
+@njit(cache=True)
+def _oinfo_batch(c, mult):
+    """O-info of multiplets (n_mult, k) from covariances (n_times, n, n)."""
+    n_times, (n_mult, k) = c.shape[0], mult.shape
+    out = np.empty((n_times, n_mult))
+    a = np.zeros((k, k))
+    lo, lo_inv = np.zeros((k, k)), np.zeros((k, k))
+    for t in range(n_times):
+        for m in range(n_mult):
+            for i in range(k):
+                for j in range(k):
+                    a[i, j] = c[t, mult[m, i], mult[m, j]]
+            out[t, m] = _oinfo_one(a, lo, lo_inv)
+    return out
+
+
+def _flat(func):
+    """Apply a kernel of batches (n_batch, n, n) to arrays (..., n, n)."""
+    def _func(c):
+        n, shape = c.shape[-1], c.shape[:-2]
+        out = func(np.ascontiguousarray(c.reshape(-1, n, n)))
+        return out.reshape(shape)
+    return _func
+
+
+KERNELS = {
+    'logdet': _flat(_logdet),
+    'oinfo_chol': _flat(_oinfo_chol),
+    'oinfo_batch': lambda c, mult: _oinfo_batch(
+        np.ascontiguousarray(c), np.ascontiguousarray(mult)),
+}
@@ -0,0 +1,78 @@
+"""Selection of the backend used by the entropy and O-info kernels."""
+# Authors: Christian Ferreyra, chrisferreyra13@gmail.com
+# Date: 2023
+# License: MIT License
+
+from importlib import import_module
+
+from frites.io import logger
+
+
+BACKENDS = ['numpy', 'jax', 'numba']
+
+# current backend and its kernels
+_BACKEND = {'name': 'numpy', 'kernels': dict()}
+# kernels of the backends already loaded, so that their compiled functions
+# are reused across calls
+_LOADED = dict()
+
+
+def set_backend(backend='numpy'):
+    """Set the backend of the entropy and O-info kernels.
+
+    With 'jax' or 'numba', the log-determinants of itpg.entropy (and thus
+    entropy_gauss_nd and compute_oinfo), compute_oinfo_chol and the inner
+    loop of conn_hoi are computed by just-in-time compiled kernels on the
+    CPU. The compiled kernels are kept for the whole session, and numba
+    also caches them on disk, so that the compilation is only paid once
+    per multiplet size (jax) or per dtype (numba). The matrices that are
+    not positive definite are processed again with NumPy. The backend is
+    set for the current process only, the parallel workers of conn_hoi
+    use NumPy.
+
+    Parameters
+    ----------
+    backend : {'numpy', 'jax', 'numba'}
+        Backend to use. If the package of the backend is not installed,
+        NumPy is used instead. Note that 'jax' enables the 64-bit precision
+        of jax.
+
+    Returns
+    -------
+    str
+        The backend that is used.
+    """
+    assert backend in BACKENDS, f"backend should be in {BACKENDS}"
+    if (backend != 'numpy') and (backend not in _LOADED):
+        try:
+            _LOADED[backend] = import_module(
+                f'._{backend}', __package__).KERNELS
+        except ImportError:
+            logger.warning(f"{backend} is not installed, NumPy is used "
+                           "instead")
+            backend = 'numpy'
+    _BACKEND['name'] = backend
+    _BACKEND['kernels'] = _LOADED.get(backend, dict())
+
+    return backend
+
+
+def get_backend():
+    """Get the name of the current backend."""
+    return _BACKEND['name']
+
+
+def get_kernel(name):
+    """Get a kernel of the current backend.
+
+    Parameters
+    ----------
+    name : {'logdet', 'oinfo_chol', 'oinfo_batch'}
+        Name of the kernel.
+
+    Returns
+    -------
+    callable | None
+        The kernel, None with NumPy.
+    """
+    return _BACKEND['kernels'].get(name)
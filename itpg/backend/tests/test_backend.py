@@ -0,0 +1,82 @@
+"""Tests for the backends of the kernels."""
+# Authors: Christian Ferreyra, chrisferreyra13@gmail.com
+# Date: 2023
+# License: MIT License
+
+import numpy as np
+import pytest
+
+from .. import backend as bk
+from ..backend import set_backend, get_backend, get_kernel
+from ...entropy.entropy_gaussian import cov_gauss_nd, logdet_nd
+from ...connectivity.oinfo import compute_oinfo_chol
+from ...connectivity.conn_oinfo import conn_hoi
+
+
+@pytest.fixture(params=['jax', 'numba'])
+def backend(request):
+    """Set a compiled backend for a test."""
+    pytest.importorskip(request.param)
+    assert set_backend(request.param) == request.param
+    yield request.param
+    set_backend('numpy')
+
+
+def _get_cov(n_times=10, n_vars=4, seed=0):
+    rng = np.random.default_rng(seed)
+    x = rng.standard_normal((n_times, n_vars, 200))
+    x[:, -1] += x[:, 0]
+    return cov_gauss_nd(x)
+
+
+def test_backend_kernels(backend):
+    """Test that the compiled kernels match numpy."""
+    assert get_backend() == backend
+    assert get_kernel('logdet') is not None
+    for n_vars in [1, 3, 7]:
+        c = _get_cov(n_vars=n_vars)
+        np.testing.assert_array_almost_equal(
+            logdet_nd(c), np.linalg.slogdet(c)[1])
+        if n_vars > 1:
+            o = compute_oinfo_chol(c)
+            set_backend('numpy')
+            o_true = compute_oinfo_chol(c)
+            set_backend(backend)
+            np.testing.assert_array_almost_equal(o, o_true)
+
+    # covariances that are not positive definite
+    c = _get_cov(n_vars=5)
+    c[3, 1, :] = c[3, :, 1] = 0.
+    with pytest.raises(np.linalg.LinAlgError):
+        compute_oinfo_chol(c)
+    logdet = logdet_nd(c, on_error='nan')
+    assert np.isnan(logdet[3]) and np.isfinite(np.delete(logdet, 3)).all()
+    o = compute_oinfo_chol(c, on_error='nan')
+    assert np.isnan(o[3]) and np.isfinite(np.delete(o, 3)).all()
+
+
+def test_backend_conn_hoi(backend):
+    """Test the inner loop of conn_hoi."""
+    rng = np.random.default_rng(0)
+    x = rng.standard_normal((100, 6, 5))
+    x[:, 2] += x[:, 0] + x[:, 1]
+    y = rng.standard_normal(100)
+
+    for kw in [dict(method='chol'), dict(method='cov', y=y),
+               dict(method='cov', cache=True, maxsize=4)]:
+        o = conn_hoi(x, **kw)
+        set_backend('numpy')
+        o_true = conn_hoi(x, **kw)
+        set_backend(backend)
+        np.testing.assert_array_almost_equal(o.data, o_true.data)
+
+
+def test_backend_fallback(monkeypatch):
+    """Test that numpy is used when the backend is missing."""
+    def _import_module(name, package=None):
+        raise ImportError(name)
+
+    monkeypatch.setattr(bk, 'import_module', _import_module)
+    monkeypatch.setattr(bk, '_LOADED', dict())
+    assert set_backend('jax') == 'numpy'
+    assert get_backend() == 'numpy' and get_kernel('logdet') is None
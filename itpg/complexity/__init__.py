@@ -3,4 +3,8 @@
 # License: MIT License
 
 from .permutation_entropy import (permutation_entropy, permutation_entropy_map,
+                                  permutation_entropy_windows,
                                   ordinal_patterns)
+from .streaming import StreamingPermutationEntropy
+from .multiscale import multiscale_permutation_entropy
+from .ordinal_statistics import ordinal_statistics, ordinal_statistics_map
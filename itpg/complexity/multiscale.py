@@ -0,0 +1,114 @@
+"""Permutation entropy over a grid of dimensions, delays and scales."""
+# Authors: Christian Ferreyra, chrisferreyra13@gmail.com
+# Date: 2023
+# License: MIT License
+
+from math import factorial
+
+import numpy as np
+import xarray as xr
+
+from .permutation_entropy import (_get_log_func, _entropy_from_counts,
+                                  _count_codes)
+
+
+def _coarse_grain(x, scale):
+    """Means of non-overlapping segments of scale points along the last axis.
+
+    Each segment is averaged on its own, rather than from differences of a
+    running cumulative sum, so that the rounding errors don't break the ties
+    between equal segments (e.g. of quantized recordings).
+    """
+    if scale == 1:
+        return x
+    n_points = (x.shape[-1] // scale) * scale
+    return x[..., :n_points].reshape(x.shape[:-1] + (-1, scale)).mean(-1)
+
+
+def _codes_by_dim(x, dims, tau):
+    """Ordinal codes of the embeddings of several dimensions.
+
+    The digits of the Lehmer codes of dimension d+1 are the ones of
+    dimension d plus one comparison with the new last value, so that each
+    pairwise comparison of the time series is computed once for all of the
+    dimensions.
+
+    Returns
+    -------
+    dict
+        Codes of shape (..., n_points-(d-1)*tau) for each dimension d.
+    """
+    n_points = x.shape[-1]
+    codes = dict()
+    digits = [np.zeros(x.shape[:-1] + (n_points,), dtype=np.int64)]
+    for d in range(2, max(dims) + 1):
+        n_pat = n_points - (d - 1) * tau
+        if n_pat <= 0:
+            break
+        # compare each value with the new last value of the patterns
+        last = x[..., (d - 1) * tau:]
+        digits = [dig[..., :n_pat] for dig in digits] + [
+            np.zeros(x.shape[:-1] + (n_pat,), dtype=np.int64)]
+        for i in range(d - 1):
+            digits[i] += last < x[..., i * tau:i * tau + n_pat]
+        if d in dims:
+            codes[d] = sum(dig * factorial(d - 1 - i)
+                           for i, dig in enumerate(digits[:-1]))
+    return codes
+
+
+def multiscale_permutation_entropy(x, dims=(3, 4, 5, 6, 7), taus=(1,),
+                                   scales=(1,), base='2', normalized=True):
+    """Compute permutation entropy for several dimensions, delays and scales.
+
+    The time series is coarse-grained once per scale, then the pairwise
+    comparisons of each delay are shared by all of the embedding
+    dimensions.
+
+    Parameters
+    ----------
+    x : ndarray, shape(n_points,) or shape(n_rows, n_points)
+        Time series.
+    dims : list, optional (default (3, 4, 5, 6, 7))
+        Embedding dimensions.
+    taus : list, optional (default (1,))
+        Embedding delays.
+    scales : list, optional (default (1,))
+        Scales of the coarse-graining, i.e. the number of points averaged in
+        non-overlapping segments.
+    base : str, optional (default '2')
+        Logarithm base for Shannon's entropy. Either '2' or 'e'.
+    normalized : bool, optional (default True)
+        If True, return normalized permutation entropy based of the maximum
+        number of permutations.
+
+    Returns
+    -------
+    xarray.DataArray, shape(n_dims, n_taus, n_scales)
+        Permutation entropy of each dimension, delay and scale, with an
+        additional leading 'rows' dimension for 2-D inputs. It is NaN when
+        the time series is too short for the embedding.
+    """
+    if not isinstance(x, np.ndarray):
+        raise TypeError("Array should be numpy array")
+    assert x.ndim in [1, 2], "x should be of shape (n_points,) or 2D"
+    log_func = _get_log_func(base)
+    dims, taus, scales = list(dims), list(taus), list(scales)
+    assert min(dims) >= 2, "dims should be at least 2"
+
+    pe = np.full(x.shape[:-1] + (len(dims), len(taus), len(scales)), np.nan)
+    for k_s, scale in enumerate(scales):
+        x_s = _coarse_grain(x, scale)
+        for k_t, tau in enumerate(taus):
+            codes = _codes_by_dim(x_s, dims, tau)
+            for k_d, dim in enumerate(dims):
+                if dim not in codes:
+                    continue
+                counts = _count_codes(codes[dim], factorial(dim))
+                pe[..., k_d, k_t, k_s] = _entropy_from_counts(
+                    counts, dim, log_func, normalized)
+
+    return xr.DataArray(
+        pe, dims=('rows',) * (x.ndim - 1) + ('dim', 'tau', 'scale'),
+        coords={'dim': dims, 'tau': taus, 'scale': scales},
+        name='PE', attrs={'base': base, 'normalized': int(normalized)})
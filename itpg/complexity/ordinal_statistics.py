@@ -0,0 +1,141 @@
+"""Ordinal statistics computed from a single histogram of ordinal patterns."""
+# Authors: Christian Ferreyra, chrisferreyra13@gmail.com
+# Date: 2023
+# License: MIT License
+
+from math import factorial
+
+import numpy as np
+
+from .permutation_entropy import (
+    _as_array, _count_codes, _entropy_from_counts, _get_log_func, _get_windows,
+    _ordinal_codes, _row_blocks, _window_counts)
+
+
+ORDINAL_STATISTICS = ['pe', 'complexity', 'missing']
+
+
+def _shannon(probs):
+    """Shannon entropy in nats along the last axis, with 0 * log(0) = 0."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return -np.where(probs > 0, probs * np.log(probs), 0.).sum(-1)
+
+
+def _statistics_from_counts(counts, dim, log_func, normalized):
+    """Ordinal statistics from the pattern counts of shape (..., dim!)."""
+    n_fact = factorial(dim)
+    n_patterns = counts.sum(-1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        probs = counts / n_patterns
+
+    # Jensen-Shannon divergence to the uniform distribution, normalized by
+    # its maximum which is reached by a single pattern (Rosso et al. 2007)
+    s_p, s_u = _shannon(probs), np.log(n_fact)
+    js = _shannon((probs + 1. / n_fact) / 2.) - s_p / 2. - s_u / 2.
+    js_max = -.5 * ((n_fact + 1.) / n_fact * np.log(n_fact + 1.) -
+                    2. * np.log(2. * n_fact) + np.log(n_fact))
+
+    stats = dict()
+    stats['pe'] = _entropy_from_counts(counts, dim, log_func, normalized)
+    stats['complexity'] = js / js_max * s_p / s_u
+    stats['missing'] = (counts == 0).sum(-1) / n_fact
+    # undefined without patterns
+    for name in ORDINAL_STATISTICS:
+        stats[name] = np.where(n_patterns[..., 0] > 0, stats[name], np.nan)
+
+    return stats
+
+
+def ordinal_statistics(x, dim=3, tau=1, base='2', normalized=True):
+    """Compute statistics of the ordinal patterns of time series.
+
+    The time series are symbolized once and the permutation entropy, the
+    Jensen-Shannon statistical complexity (complexity-entropy plane) and the
+    ratio of missing (forbidden) patterns are all obtained from the same
+    histogram of ordinal patterns.
+
+    Parameters
+    ----------
+    x : ndarray, shape(..., n_points)
+        Time series, e.g. of shape (n_channels, n_points).
+    dim : int, optional (default 3)
+        Embedding dimension.
+    tau : int, optional (default 1)
+        Embedding delay.
+    base : str, optional (default '2')
+        Logarithm base for Shannon's entropy. Either '2' or 'e'.
+    normalized : bool, optional (default True)
+        If True, return normalized permutation entropy based of the maximum
+        number of permutations.
+
+    Returns
+    -------
+    dict
+        Statistics of shape (...,) with the keys:
+
+            * 'pe' : permutation entropy
+            * 'complexity' : Jensen-Shannon statistical complexity
+            * 'missing' : ratio of the dim! patterns that are not observed
+    """
+    if not isinstance(x, np.ndarray):
+        raise TypeError("Array should be numpy array")
+    log_func = _get_log_func(base)
+
+    counts = _count_codes(_ordinal_codes(x, dim, tau), factorial(dim))
+
+    return _statistics_from_counts(counts, dim, log_func, normalized)
+
+
+def ordinal_statistics_map(x, fs, tw=1, dim=3, base='2', normalized=True,
+                           tau=1):
+    """Compute maps of the statistics of the ordinal patterns.
+
+    Same as permutation_entropy_map but for all of the ordinal statistics,
+    computed from one histogram per row and time window.
+
+    Parameters
+    ----------
+    x : ndarray | str, shape(n_rows, n_points)
+        Time series map. It can be a memory-mapped array or the path to a
+        .npy file.
+    fs : float
+        Sampling frequency.
+    tw : float, optional (default 1)
+        Time window in seconds to split the time series.
+    dim : int, optional (default 3)
+        Embedding dimension.
+    base : str, optional (default '2')
+        Logarithm base for Shannon's entropy. Either '2' or 'e'.
+    normalized : bool, optional (default True)
+        If True, return normalized permutation entropy based of the maximum
+        number of permutations.
+    tau : int, optional (default 1)
+        Embedding delay.
+
+    Returns
+    -------
+    dict
+        Maps of shape (n_rows, n_points) of each statistic (see
+        ordinal_statistics).
+    """
+    x = _as_array(x)
+    log_func = _get_log_func(base)
+    n_rows, n_times = x.shape
+    starts, stops = _get_windows(n_times, fs, tw, tw)
+
+    # statistics of each row and window
+    stats = {name: np.zeros((n_rows, len(starts)))
+             for name in ORDINAL_STATISTICS}
+    for rows in _row_blocks(n_rows, len(starts) * factorial(dim)):
+        counts = _window_counts(np.asarray(x[rows]), starts, stops, dim, tau)
+        _stats = _statistics_from_counts(counts, dim, log_func, normalized)
+        for name in ORDINAL_STATISTICS:
+            stats[name][rows] = _stats[name]
+
+    # broadcast the windows to their time points
+    maps = {name: np.zeros((n_rows, n_times)) for name in ORDINAL_STATISTICS}
+    for k, (start, stop) in enumerate(zip(starts, stops)):
+        for name in ORDINAL_STATISTICS:
+            maps[name][:, start:stop] = stats[name][:, [k]]
+
+    return maps
@@ -3,9 +3,36 @@
 # Date: 2023
 # License: MIT License
 
+from math import factorial
+
 import numpy as np
 
 
+def _embed(x, dim, tau):
+    """Delay embedding of shape (..., n_points-(dim-1)*tau, dim) as a view."""
+    win = np.lib.stride_tricks.sliding_window_view(
+        x, (dim - 1) * tau + 1, axis=-1)
+    return win[..., ::tau]
+
+
+def _ordinal_codes(x, dim=3, tau=1):
+    """Encode the ordinal patterns along the last axis as integers.
+
+    Each pattern is encoded by its Lehmer code in [0, dim!), which follows the
+    lexicographic order of the permutations. The i-th digit of the code is
+    the number of values after the i-th one that are smaller, which is
+    computed directly from the embedding without sorting.
+    """
+    emb = _embed(x, dim, tau)
+    codes = np.zeros(emb.shape[:-1], dtype=np.int64)
+    for i in range(dim - 1):
+        digit = np.zeros(emb.shape[:-1], dtype=np.int64)
+        for j in range(i + 1, dim):
+            digit += emb[..., j] < emb[..., i]
+        codes += digit * factorial(dim - 1 - i)
+    return codes
+
+
 def ordinal_patterns(x, dim=3, tau=1, return_probs=True):
     """Compute ordinal patters (permutations) from an array.
 
@@ -27,24 +54,20 @@ def ordinal_patterns(x, dim=3, tau=1, return_probs=True):
     ndarray
         Probabilities of each pattern (permutation).
     """
-    n = x.shape[0]
-    x = np.array([x])
-
-    # create partitions, matrix of 'dim' rows and n-(dim-1)*tau columns
-    partitions = np.concatenate(
-        [[x[0, i:i+dim*tau:tau]] for i in range(n-(dim-1)*tau)]
-    )
-    # get the order of each column and the sort again to get the permutation
-    order = np.apply_along_axis(np.argsort, 1, partitions)
-    patterns = np.apply_along_axis(np.argsort, 1, order)
+    # permutation of each partition, matrix of n-(dim-1)*tau rows and 'dim'
+    # columns (ties are ordered by position)
+    partitions = _embed(np.asarray(x), dim, tau)
+    order = np.argsort(partitions, axis=-1, kind='stable')
+    patterns = np.argsort(order, axis=-1, kind='stable')
 
     if not return_probs:
         return patterns
     else:
-        # compute probs based on observation frequency
-        _, patterns_count = np.unique(
-            patterns, return_counts=True, axis=0)
-        probs = patterns_count/len(partitions)
+        # compute probs based on observation frequency, the patterns are
+        # counted by code to follow the lexicographic order
+        codes = _ordinal_codes(x, dim, tau)
+        patterns_count = np.bincount(codes, minlength=factorial(dim))
+        probs = patterns_count[patterns_count > 0]/len(partitions)
 
         return patterns, probs
 
@@ -86,38 +109,30 @@ def permutation_entropy(x, dim=3, tau=1, base='2', normalized=True):
     if not isinstance(x, np.ndarray):
         raise TypeError("Array should be numpy array")
 
-    if base not in ['2', 'e']:
-        if base == 2:
-            raise TypeError("Base 2 parameter should be a string")
-        else:
-            raise ValueError("Base parameter should be '2' or 'e'")
+    log_func = _get_log_func(base)
 
-    _, probs = ordinal_patterns(x, dim, tau)
+    codes = _ordinal_codes(x, dim, tau)
+    patterns_count = np.bincount(codes, minlength=factorial(dim))
 
-    # point to log function
-    if base == '2':
-        log_func = np.log2
-    else:
-        log_func = np.log
-
-    if normalized:
-        # pe_max is log(dim!) which is the max number of permutations
-        pe_max = log_func(float(np.math.factorial(dim)))
-        pe = -np.sum(probs*log_func(probs))
-        return pe/pe_max
-    else:
-        return -np.sum(probs*log_func(probs))
+    return _entropy_from_counts(patterns_count, dim, log_func, normalized)
 
 
-def permutation_entropy_map(x, fs, tw=1, dim=3, base='2', normalized=True):
+def permutation_entropy_map(x, fs, tw=1, dim=3, base='2', normalized=True,
+                            tau=1, step=None, out=None):
     """Compute permutation entropy of a time series map.
 
     Note: Permutation entropy defined in Bandt and Pompe 2002.
 
+    The ordinal patterns of the whole map are encoded at once and then
+    counted for every row and time window. Patterns that are not entirely
+    inside a time window are not counted.
+
     Parameters
     ----------
-    x : ndarray, shape(n_points,)
-        Array to compute symbolization and get ordinal patterns.
+    x : ndarray, shape(n_rows, n_points)
+        Array to compute symbolization and get ordinal patterns. It can be
+        a memory-mapped array or the path to a .npy file, which are read by
+        blocks of time windows (see permutation_entropy_windows).
     fs : float
         Sampling frequency.
     tw : float, optional (default 1)
@@ -131,19 +146,280 @@ def permutation_entropy_map(x, fs, tw=1, dim=3, base='2', normalized=True):
     normalized : bool, optional (default True)
         If True, return normalized permutation entropy based of the maximum
         number of permutations.
+    step : float, optional (default None)
+        Step in seconds between the starts of two consecutive time windows.
+        If smaller than tw, the windows overlap and the pattern counts are
+        updated incrementally from a window to the next one. If None, step
+        is tw and the windows do not overlap.
+    out : ndarray, shape(n_rows, n_points), optional (default None)
+        Array in which the map is written, e.g. a memory-mapped array to not
+        allocate the map in memory.
 
     Returns
     -------
-    float
-        Permutation entropy map.
+    ndarray, shape(n_rows, n_points)
+        Permutation entropy map. The permutation entropy of a time window is
+        given to the time points from its start to the start of the next
+        window.
     """
+    x = _as_array(x)
+    step = tw if step is None else step
     n_rows, n_times = x.shape
-    pe_map = np.zeros((n_rows, n_times))
-    slices = [slice(int(k*tw*fs), int((k+1)*tw*fs))
-              for k in range(int(n_times/(tw*fs)))]
-    for j, time_series in enumerate(x):
-        for s in slices:
-            pe_map[j, s] = permutation_entropy(
-                time_series[s], dim=dim, base=base, normalized=normalized)
+    starts, stops = _get_windows(n_times, fs, tw, step)
+    pe = permutation_entropy_windows(
+        x, fs, tw=tw, dim=dim, base=base, normalized=normalized, tau=tau,
+        step=step)
+
+    # broadcast the windows to their time points
+    pe_map = np.zeros((n_rows, n_times)) if out is None else out
+    assert pe_map.shape == (n_rows, n_times)
+    pe_map[:, :starts[0] if len(starts) else n_times] = 0.
+    for k, (start, stop) in enumerate(zip(starts, stops)):
+        end = starts[k + 1] if k + 1 < len(starts) else n_times
+        stop = min(stop, int((k+1)*step*fs))
+        pe_map[:, start:stop] = pe[:, [k]]
+        pe_map[:, stop:end] = 0.
 
     return pe_map
+
+
+def permutation_entropy_windows(x, fs, tw=1, dim=3, base='2', normalized=True,
+                                tau=1, step=None, block_size=2**24):
+    """Compute permutation entropy of the time windows of a time series map.
+
+    The time series are read by blocks of consecutive time windows, so that
+    memory-mapped or on-disk recordings larger than the memory can be
+    processed. Consecutive blocks overlap when the windows do, and the
+    patterns that start at the end of a window are read with it.
+
+    Parameters
+    ----------
+    x : ndarray | str, shape(n_rows, n_points)
+        Array (e.g. np.memmap) or path to a .npy file which is opened as a
+        memory-mapped array.
+    fs : float
+        Sampling frequency.
+    tw : float, optional (default 1)
+        Time window in seconds.
+    dim : int, optional (default 3)
+        Embedding dimension.
+    base : str, optional (default '2')
+        Logarithm base for Shannon's entropy. Either '2' or 'e'.
+    normalized : bool, optional (default True)
+        If True, return normalized permutation entropy based of the maximum
+        number of permutations.
+    tau : int, optional (default 1)
+        Embedding delay.
+    step : float, optional (default None)
+        Step in seconds between the starts of two consecutive time windows.
+        If None, step is tw and the windows do not overlap.
+    block_size : int, optional (default 2**24)
+        Maximum number of points of x read at once.
+
+    Returns
+    -------
+    ndarray, shape(n_rows, n_windows)
+        Permutation entropy of each row and time window.
+    """
+    x = _as_array(x)
+    log_func = _get_log_func(base)
+    step = tw if step is None else step
+    assert int(step*fs) >= 1, "step should be at least one sample"
+    n_rows, n_times = x.shape
+    starts, stops = _get_windows(n_times, fs, tw, step)
+    pe = np.zeros((n_rows, len(starts)))
+    if not len(starts):
+        return pe
+
+    # number of rows and windows of the blocks
+    n_win_points = int(tw*fs)
+    for rows in _row_blocks(n_rows, n_win_points, block_size):
+        n_blk_rows = len(range(n_rows)[rows])
+        n_points = max(block_size // n_blk_rows - n_win_points, 0)
+        n_blk = int(n_points // max(int(step*fs), 1)) + 1
+        for k in range(0, len(starts), n_blk):
+            win = slice(k, k + n_blk)
+            first, last = starts[win][0], stops[win][-1]
+            x_blk = np.asarray(x[rows, first:last])
+            pe[rows, win] = _windows_entropy(
+                x_blk, starts[win] - first, stops[win] - first, dim, tau,
+                log_func, normalized, overlap=step < tw)
+
+    return pe
+
+
+def _as_array(x):
+    """Open a .npy file as a memory-mapped array."""
+    if isinstance(x, str):
+        return np.load(x, mmap_mode='r')
+    return x
+
+
+def _windows_entropy(x, starts, stops, dim, tau, log_func, normalized,
+                     overlap=False):
+    """Permutation entropy of each row and time window of an array."""
+    n_rows = x.shape[0]
+    pe = np.zeros((n_rows, len(starts)))
+    n_hist = factorial(dim) * (1 if overlap else len(starts))
+    for rows in _row_blocks(n_rows, n_hist):
+        if overlap:
+            pe[rows] = _sliding_entropy(
+                x[rows], starts, stops, dim, tau, log_func, normalized)
+        else:
+            counts = _window_counts(x[rows], starts, stops, dim, tau)
+            pe[rows] = _entropy_from_counts(counts, dim, log_func, normalized)
+    return pe
+
+
+def _get_windows(n_times, fs, tw, step):
+    """First and last (excluded) time points of the time windows."""
+    if step == tw:
+        n_windows = int(n_times/(tw*fs))
+        starts = [int(k*tw*fs) for k in range(n_windows)]
+        stops = [int((k+1)*tw*fs) for k in range(n_windows)]
+    else:
+        starts, stops = [], []
+        while int(len(starts)*step*fs + tw*fs) <= n_times:
+            starts.append(int(len(starts)*step*fs))
+            stops.append(int(starts[-1] + tw*fs))
+    return np.array(starts, dtype=int), np.array(stops, dtype=int)
+
+
+def _get_log_func(base):
+    """Get the logarithm function of a base."""
+    if base not in ['2', 'e']:
+        if base == 2:
+            raise TypeError("Base 2 parameter should be a string")
+        else:
+            raise ValueError("Base parameter should be '2' or 'e'")
+
+    # point to log function
+    return np.log2 if base == '2' else np.log
+
+
+def _entropy_from_counts(counts, dim, log_func, normalized):
+    """Permutation entropy from pattern counts of shape (..., dim!)."""
+    n_patterns = counts.sum(-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        probs = counts / n_patterns[..., np.newaxis]
+        pe = -np.where(counts > 0, probs * log_func(probs), 0.).sum(-1)
+    # no pattern in the time series
+    pe = np.where(n_patterns > 0, pe, np.nan)
+
+    if normalized:
+        # pe_max is log(dim!) which is the max number of permutations
+        pe_max = log_func(float(factorial(dim)))
+        return pe/pe_max
+    else:
+        return pe
+
+
+def _count_codes(codes, n_fact, weights=None):
+    """Histogram of the codes along the last axis, shape (..., n_fact)."""
+    shape = codes.shape[:-1]
+    offsets = np.arange(int(np.prod(shape)), dtype=np.int64) * n_fact
+    idx = (offsets.reshape(shape + (1,)) + codes).ravel()
+    if weights is not None:
+        weights = np.broadcast_to(weights, codes.shape).ravel()
+    counts = np.bincount(idx, weights=weights, minlength=offsets.size*n_fact)
+    return counts.reshape(shape + (n_fact,))
+
+
+def _row_blocks(n_rows, row_size, max_size=2**23):
+    """Split the rows in blocks of at most max_size elements."""
+    n_block = max(1, max_size // max(row_size, 1))
+    return [slice(k, k + n_block) for k in range(0, n_rows, n_block)]
+
+
+def _window_counts(x, starts, stops, dim=3, tau=1):
+    """Count the ordinal patterns in time windows.
+
+    Only the patterns that are entirely inside a window are counted. The
+    histograms of all of the rows and windows are computed with a single
+    bincount over the (row, window, pattern) indices.
+
+    Parameters
+    ----------
+    x : ndarray, shape(n_rows, n_points)
+        Time series.
+    starts, stops : ndarray, shape(n_windows,)
+        First and last (excluded) time points of each window.
+
+    Returns
+    -------
+    ndarray, shape(n_rows, n_windows, dim!)
+        Number of observations of each pattern.
+    """
+    n_rows, n_fact = x.shape[0], factorial(dim)
+    codes = _ordinal_codes(x, dim, tau)
+
+    # window of each pattern, -1 if it is not in a window
+    win = np.full((codes.shape[-1],), -1, dtype=np.int64)
+    for k, (start, stop) in enumerate(zip(starts, stops)):
+        win[start:max(start, stop - (dim - 1) * tau)] = k
+    is_win = win >= 0
+
+    # segmented bincount over (row, window, pattern)
+    rows = np.arange(n_rows)[:, np.newaxis] * len(starts)
+    idx = ((rows + win[is_win]) * n_fact + codes[:, is_win]).ravel()
+    counts = np.bincount(idx, minlength=n_rows * len(starts) * n_fact)
+
+    return counts.reshape(n_rows, len(starts), n_fact)
+
+
+def _sliding_entropy(x, starts, stops, dim, tau, log_func, normalized):
+    """Permutation entropy of overlapping time windows.
+
+    The pattern counts of a window are obtained from the ones of the
+    previous window by removing the patterns that left the window and adding
+    the ones that entered it, so that each pattern is added and removed once.
+
+    Parameters
+    ----------
+    x : ndarray, shape(n_rows, n_points)
+        Time series.
+    starts, stops : ndarray, shape(n_windows,)
+        First and last (excluded) time points of each window, both
+        increasing.
+
+    Returns
+    -------
+    ndarray, shape(n_rows, n_windows)
+        Permutation entropy of each row and window.
+    """
+    n_rows, n_fact = x.shape[0], factorial(dim)
+    codes = _ordinal_codes(x, dim, tau)
+    offsets = np.arange(n_rows)[:, np.newaxis] * n_fact
+    n_bins = n_rows * n_fact
+    # patterns of the windows in [p_starts, p_stops)
+    p_starts = starts
+    p_stops = np.maximum(starts, stops - (dim - 1) * tau)
+
+    def _count(start, stop):
+        idx = (offsets + codes[:, start:stop]).ravel()
+        return np.bincount(idx, minlength=n_bins).reshape(n_rows, n_fact)
+
+    # sum of c * log(c) over the patterns of each window, from a lookup table
+    clogc = np.arange(np.max(p_stops - p_starts, initial=0) + 1, dtype=float)
+    clogc[1:] *= log_func(clogc[1:])
+    n_patterns = p_stops - p_starts
+    sum_clogc = np.zeros((n_rows, len(starts)))
+
+    counts = np.zeros((n_rows, n_fact), dtype=np.int64)
+    prev_start, prev_stop = 0, 0
+    for k, (start, stop) in enumerate(zip(p_starts, p_stops)):
+        # patterns leaving and entering the window
+        counts -= _count(prev_start, min(prev_stop, start))
+        counts += _count(max(prev_stop, start), stop)
+        sum_clogc[:, k] = clogc[counts].sum(-1)
+        prev_start, prev_stop = start, stop
+
+    # H = log(n) - sum(c * log(c)) / n
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pe = log_func(n_patterns) - sum_clogc / n_patterns
+    pe[:, n_patterns == 0] = np.nan
+
+    if normalized:
+        return pe / log_func(float(n_fact))
+    else:
+        return pe
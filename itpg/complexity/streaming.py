@@ -0,0 +1,133 @@
+"""Streaming permutation entropy for online acquisition."""
+# Authors: Christian Ferreyra, chrisferreyra13@gmail.com
+# Date: 2023
+# License: MIT License
+
+from math import factorial
+
+import numpy as np
+
+from .permutation_entropy import (_ordinal_codes, _get_log_func,
+                                  _entropy_from_counts, _count_codes)
+
+
+class StreamingPermutationEntropy(object):
+    """Permutation entropy of time series received by chunks.
+
+    The last (dim-1)*tau samples and the pattern counts are kept between two
+    updates, so that each update only encodes the patterns of the new chunk.
+    Without window and decay, the permutation entropy after several updates
+    is the one of the concatenated chunks.
+
+    Parameters
+    ----------
+    dim : int, optional (default 3)
+        Embedding dimension.
+    tau : int, optional (default 1)
+        Embedding delay.
+    base : str, optional (default '2')
+        Logarithm base for Shannon's entropy. Either '2' or 'e'.
+    normalized : bool, optional (default True)
+        If True, return normalized permutation entropy based of the maximum
+        number of permutations.
+    window : int, optional (default None)
+        If given, only the last window patterns are counted.
+    decay : float, optional (default None)
+        If given, the counts are multiplied by decay in ]0, 1] for each new
+        pattern, which exponentially forgets the oldest patterns. Can not be
+        used with a window.
+    """
+
+    def __init__(self, dim=3, tau=1, base='2', normalized=True, window=None,
+                 decay=None):
+        assert (window is None) or (window > 0)
+        assert (decay is None) or (0 < decay <= 1)
+        if (window is not None) and (decay is not None):
+            raise ValueError("window and decay can not be used together")
+        self.dim, self.tau = dim, tau
+        self.base, self.normalized = base, normalized
+        self.window, self.decay = window, decay
+        self._log_func = _get_log_func(base)
+        self.reset()
+
+    def __repr__(self):
+        return (f"StreamingPermutationEntropy(dim={self.dim}, tau={self.tau}, "
+                f"n_samples={self.n_samples})")
+
+    def reset(self):
+        """Forget the samples and the pattern counts."""
+        self.n_samples = 0
+        self.counts = None
+        self._tail = None
+        self._codes, self._pos, self._n_codes = None, 0, 0
+
+    @property
+    def entropy(self):
+        """Permutation entropy of the patterns counted so far."""
+        if self.counts is None:
+            return np.nan
+        return _entropy_from_counts(self.counts, self.dim, self._log_func,
+                                    self.normalized)
+
+    def update(self, chunk):
+        """Add a chunk of samples.
+
+        Parameters
+        ----------
+        chunk : array_like, shape(..., n_points)
+            New samples. Leading dimensions (e.g. channels) must be the same
+            for all of the chunks.
+
+        Returns
+        -------
+        float | ndarray, shape(...)
+            Permutation entropy after the update.
+        """
+        chunk = np.asarray(chunk)
+        n_fact = factorial(self.dim)
+        if self.counts is None:
+            dtype = np.int64 if self.decay is None else float
+            self.counts = np.zeros(chunk.shape[:-1] + (n_fact,), dtype=dtype)
+            self._tail = chunk[..., :0]
+
+        # patterns of the new samples, including the ones that start in the
+        # previous chunks
+        x = np.concatenate((self._tail, chunk), axis=-1)
+        n_keep = (self.dim - 1) * self.tau
+        self._tail = x[..., max(x.shape[-1] - n_keep, 0):]
+        self.n_samples += chunk.shape[-1]
+        if x.shape[-1] <= n_keep:
+            return self.entropy
+        codes = _ordinal_codes(x, self.dim, self.tau)
+
+        if self.window is not None:
+            self._update_window(codes, n_fact)
+        elif self.decay is not None:
+            n_new = codes.shape[-1]
+            weights = self.decay ** np.arange(n_new - 1, -1, -1)
+            self.counts *= self.decay ** n_new
+            self.counts += _count_codes(codes, n_fact, weights)
+        else:
+            self.counts += _count_codes(codes, n_fact)
+
+        return self.entropy
+
+    def _update_window(self, codes, n_fact):
+        """Update the counts of the last window patterns (ring buffer)."""
+        if self._codes is None:
+            self._codes = np.zeros(codes.shape[:-1] + (self.window,),
+                                   dtype=np.int64)
+        codes = codes[..., -self.window:]
+        n_new = codes.shape[-1]
+        pos = (self._pos + np.arange(n_new)) % self.window
+
+        # remove the oldest patterns
+        n_old = max(self._n_codes + n_new - self.window, 0)
+        if n_old:
+            old = self._codes[..., pos[n_new - n_old:]]
+            self.counts -= _count_codes(old, n_fact)
+
+        self._codes[..., pos] = codes
+        self.counts += _count_codes(codes, n_fact)
+        self._pos = (self._pos + n_new) % self.window
+        self._n_codes = min(self._n_codes + n_new, self.window)
@@ -0,0 +1,36 @@
+"""Tests for multiscale permutation entropy."""
+# Authors: Christian Ferreyra, chrisferreyra13@gmail.com
+# Date: 2023
+# License: MIT License
+
+import numpy as np
+
+from ..permutation_entropy import permutation_entropy
+from ..multiscale import multiscale_permutation_entropy
+
+
+def test_multiscale_permutation_entropy():
+    """Test the grid against the permutation entropy of each parameter."""
+    rng = np.random.default_rng(0)
+    dims, taus, scales = [2, 3, 5, 6], [1, 2, 4], [1, 2, 3, 7]
+    # quantized values to also have ties between the segments
+    for x in [rng.normal(size=(2, 600)),
+              rng.integers(0, 5, (2, 2000)) * .1 + 50]:
+        pe = multiscale_permutation_entropy(x, dims=dims, taus=taus,
+                                            scales=scales, base='e')
+        assert pe.dims == ('rows', 'dim', 'tau', 'scale')
+        assert pe.shape == (2, len(dims), len(taus), len(scales))
+        for scale in scales:
+            n_points = (x.shape[1] // scale) * scale
+            x_s = x[:, :n_points].reshape(2, -1, scale).mean(-1)
+            for tau in taus:
+                for dim in dims:
+                    pe_true = [permutation_entropy(_x, dim=dim, tau=tau,
+                                                   base='e') for _x in x_s]
+                    np.testing.assert_array_almost_equal(
+                        pe.sel(dim=dim, tau=tau, scale=scale), pe_true)
+
+    # 1-D time series that is too short for the largest embedding
+    pe = multiscale_permutation_entropy(x[0, :10], dims=[3, 6], taus=[2])
+    assert pe.dims == ('dim', 'tau', 'scale')
+    assert np.isnan(pe.sel(dim=6)).all() and not np.isnan(pe.sel(dim=3)).any()
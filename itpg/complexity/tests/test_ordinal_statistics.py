@@ -0,0 +1,61 @@
+"""Tests for ordinal statistics."""
+# Authors: Christian Ferreyra, chrisferreyra13@gmail.com
+# Date: 2023
+# License: MIT License
+
+import numpy as np
+
+from ..permutation_entropy import (permutation_entropy,
+                                   permutation_entropy_map, ordinal_patterns)
+from ..ordinal_statistics import ordinal_statistics, ordinal_statistics_map
+
+
+def _complexity(probs, n_fact):
+    """Statistical complexity of Rosso et al. 2007 from the definition."""
+    probs = np.r_[probs, np.zeros(n_fact - len(probs))]
+    unif = np.ones(n_fact) / n_fact
+
+    def _s(p):
+        p = p[p > 0]
+        return -np.sum(p * np.log(p))
+
+    js = _s((probs + unif) / 2) - _s(probs) / 2 - _s(unif) / 2
+    js_max = -.5 * ((n_fact + 1) / n_fact * np.log(n_fact + 1) -
+                    2 * np.log(2 * n_fact) + np.log(n_fact))
+    return js / js_max * _s(probs) / np.log(n_fact)
+
+
+def test_ordinal_statistics():
+    """Test the statistics of a set of time series."""
+    rng = np.random.default_rng(0)
+    x = np.r_[rng.normal(size=(2, 300)), np.sin(np.arange(300) / 10.)[None]]
+
+    stats = ordinal_statistics(x, dim=4, tau=2)
+    for i, _x in enumerate(x):
+        _, probs = ordinal_patterns(_x, dim=4, tau=2)
+        np.testing.assert_almost_equal(
+            stats['pe'][i], permutation_entropy(_x, dim=4, tau=2))
+        np.testing.assert_almost_equal(
+            stats['complexity'][i], _complexity(probs, 24))
+        np.testing.assert_almost_equal(
+            stats['missing'][i], 1 - len(probs) / 24)
+    # a sine has many forbidden patterns, unlike noise
+    assert stats['missing'][2] > .5 and stats['missing'][0] == 0.
+
+    # limit cases of the complexity-entropy plane
+    stats = ordinal_statistics(np.arange(100.))
+    np.testing.assert_almost_equal(stats['pe'], 0.)
+    np.testing.assert_almost_equal(stats['complexity'], 0.)
+
+
+def test_ordinal_statistics_map():
+    """Test that the maps match the permutation entropy map."""
+    rng = np.random.default_rng(0)
+    x = rng.normal(size=(3, 250))
+
+    maps = ordinal_statistics_map(x, 10, tw=3, dim=3)
+    pe_map = permutation_entropy_map(x, 10, tw=3, dim=3)
+    np.testing.assert_array_almost_equal(maps['pe'], pe_map)
+    np.testing.assert_array_almost_equal(
+        maps['complexity'][:, :30],
+        np.tile(ordinal_statistics(x[:, :30])['complexity'][:, None], 30))
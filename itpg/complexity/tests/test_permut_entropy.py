@@ -7,7 +7,8 @@
 import numpy as np
 
 from ..permutation_entropy import (
-    permutation_entropy, permutation_entropy_map, ordinal_patterns)
+    permutation_entropy, permutation_entropy_map, permutation_entropy_windows,
+    ordinal_patterns)
 
 
 def test_permutation_entropy():
@@ -63,3 +64,90 @@ def test_ordinal_patterns():
     patterns, probs = ordinal_patterns(x, dim=3, tau=1, return_probs=True)
     np.testing.assert_array_equal(patterns, patterns_true)
     np.testing.assert_array_equal(probs, probs_true)
+
+
+def test_ordinal_patterns_vectorized():
+    """Test the vectorized ordinal patterns against the naive method."""
+    rng = np.random.default_rng(0)
+    # integers to also have ties
+    x = rng.integers(0, 10, 500)
+
+    for dim in [2, 3, 4, 5]:
+        for tau in [1, 2, 3]:
+            partitions = np.array([x[i:i + dim * tau:tau]
+                                   for i in range(len(x) - (dim - 1) * tau)])
+            # ties are ordered by position
+            order = np.argsort(partitions, axis=1, kind='stable')
+            patterns_true = np.argsort(order, axis=1, kind='stable')
+            _, counts = np.unique(patterns_true, return_counts=True, axis=0)
+
+            patterns, probs = ordinal_patterns(x, dim=dim, tau=tau)
+            np.testing.assert_array_equal(patterns, patterns_true)
+            np.testing.assert_array_almost_equal(
+                probs, counts / len(partitions))
+
+
+def test_permutation_entropy_map_batched():
+    """Test the batched map against the entropy of each window."""
+    rng = np.random.default_rng(0)
+    x = rng.normal(size=(4, 230))
+    fs, tw = 10, 4.5
+
+    for dim, tau in [(3, 1), (4, 2), (5, 3)]:
+        pe = permutation_entropy_map(x, fs, tw=tw, dim=dim, tau=tau)
+        pe_true = np.zeros(x.shape)
+        for k in range(int(x.shape[1] / (tw * fs))):
+            sl = slice(int(k * tw * fs), int((k + 1) * tw * fs))
+            for i in range(x.shape[0]):
+                pe_true[i, sl] = permutation_entropy(
+                    x[i, sl], dim=dim, tau=tau, normalized=True)
+        np.testing.assert_array_almost_equal(pe, pe_true)
+
+
+def test_permutation_entropy_map_step():
+    """Test the map with overlapping time windows."""
+    rng = np.random.default_rng(0)
+    x = rng.integers(0, 5, (3, 120))
+    fs, tw, dim, tau = 10, 3, 4, 2
+
+    for step in [.1, .7, 1.5, 3]:
+        pe = permutation_entropy_map(x, fs, tw=tw, dim=dim, tau=tau,
+                                     step=step)
+        pe_true = np.zeros(x.shape)
+        k = 0
+        while int(k * step * fs) + tw * fs <= x.shape[1]:
+            start = int(k * step * fs)
+            win = x[:, start:start + tw * fs]
+            hop = slice(start, min(start + tw * fs, int((k + 1) * step * fs)))
+            for i in range(x.shape[0]):
+                pe_true[i, hop] = permutation_entropy(win[i], dim=dim, tau=tau)
+            k += 1
+        np.testing.assert_array_almost_equal(pe, pe_true)
+
+
+def test_permutation_entropy_out_of_core(tmp_path):
+    """Test the map of a memory-mapped array read by blocks."""
+    rng = np.random.default_rng(0)
+    x = rng.integers(0, 5, (5, 400))
+    fname = str(tmp_path / 'x.npy')
+    np.save(fname, x)
+    fs, tw, dim, tau = 10, 2, 4, 3
+
+    for step in [None, .5, 3]:
+        pe_map = permutation_entropy_map(x, fs, tw=tw, dim=dim, tau=tau,
+                                         step=step)
+        pe = permutation_entropy_windows(x, fs, tw=tw, dim=dim, tau=tau,
+                                         step=step)
+        # blocks of a few rows and windows
+        pe_blk = permutation_entropy_windows(fname, fs, tw=tw, dim=dim,
+                                             tau=tau, step=step, block_size=90)
+        np.testing.assert_array_equal(pe_blk, pe)
+
+        out = np.lib.format.open_memmap(
+            str(tmp_path / 'pe.npy'), mode='w+', shape=x.shape)
+        out[:] = -1.
+        permutation_entropy_map(fname, fs, tw=tw, dim=dim, tau=tau,
+                                step=step, out=out)
+        np.testing.assert_array_equal(out, pe_map)
+        # the map gives the window values to the time points
+        np.testing.assert_array_equal(pe_map[:, 0], pe[:, 0])
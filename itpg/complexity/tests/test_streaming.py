@@ -0,0 +1,69 @@
+"""Tests for streaming permutation entropy."""
+# Authors: Christian Ferreyra, chrisferreyra13@gmail.com
+# Date: 2023
+# License: MIT License
+
+import numpy as np
+import pytest
+
+from ..permutation_entropy import permutation_entropy
+from ..streaming import StreamingPermutationEntropy
+
+
+def _get_chunks(n_points=500, seed=0):
+    rng = np.random.default_rng(seed)
+    # integers to also have ties
+    x = rng.integers(0, 6, (3, n_points))
+    bounds = np.sort(rng.choice(np.arange(1, n_points), 20, replace=False))
+    return x, np.split(x, bounds, axis=-1)
+
+
+def test_streaming_pe():
+    """Test that the chunks give the permutation entropy of the whole."""
+    x, chunks = _get_chunks()
+    for dim, tau in [(3, 1), (4, 3), (5, 2)]:
+        spe = StreamingPermutationEntropy(dim=dim, tau=tau)
+        for chunk in chunks:
+            pe = spe.update(chunk)
+        pe_true = [permutation_entropy(_x, dim=dim, tau=tau) for _x in x]
+        np.testing.assert_array_equal(pe, pe_true)
+        assert spe.n_samples == x.shape[1]
+
+        # 1-D time series
+        spe.reset()
+        for chunk in chunks:
+            pe = spe.update(chunk[0])
+        assert pe == pe_true[0]
+
+
+def test_streaming_pe_window():
+    """Test the permutation entropy of the last patterns."""
+    x, chunks = _get_chunks()
+    dim, tau, window = 4, 2, 50
+    spe = StreamingPermutationEntropy(dim=dim, tau=tau, window=window)
+    n_points = 0
+    for chunk in chunks:
+        pe = spe.update(chunk)
+        n_points += chunk.shape[-1]
+        start = max(n_points - window - (dim - 1) * tau, 0)
+        pe_true = [permutation_entropy(_x[start:n_points], dim=dim, tau=tau)
+                   for _x in x]
+        np.testing.assert_array_almost_equal(pe, pe_true)
+
+
+def test_streaming_pe_decay():
+    """Test the exponential forgetting of the patterns."""
+    x, chunks = _get_chunks()
+    spe = StreamingPermutationEntropy(decay=.9)
+    for chunk in chunks:
+        spe.update(chunk)
+    # weighted counts of the patterns computed at once
+    spe_true = StreamingPermutationEntropy(decay=.9)
+    spe_true.update(x)
+    np.testing.assert_array_almost_equal(spe.counts, spe_true.counts)
+    # the total count is the geometric sum of the weights
+    np.testing.assert_array_almost_equal(
+        spe.counts.sum(-1), (1 - .9 ** (x.shape[1] - 2)) / (1 - .9))
+
+    with pytest.raises(ValueError):
+        StreamingPermutationEntropy(window=10, decay=.9)
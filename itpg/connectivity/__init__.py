@@ -2,6 +2,11 @@
 # Authors: Christian Ferreyra, chrisferreyra13@gmail.com
 # License: MIT License
 
-from .oinfo import compute_oinfo
-from .utils import get_combinations
-from .conn_oinfo import conn_hoi
+from .oinfo import compute_oinfo, compute_oinfo_cov, compute_oinfo_chol
+from .utils import (get_combinations, CombinationIndex, get_multiplet_members,
+                    get_multiplet_labels, select_multiplets)
+from .prepared import HOIData
+from .conn_oinfo import conn_hoi, merge_hoi_shards
+from .hoi_search import conn_hoi_beam
+from .hoi_stats import conn_hoi_stats, conn_hoi_boot
+from .cache import EntropyCache
@@ -0,0 +1,220 @@
+"""Cache of the entropies of subsets of variables."""
+# Authors: Christian Ferreyra, chrisferreyra13@gmail.com
+# Date: 2023
+# License: MIT License
+
+import numpy as np
+from scipy.special import comb
+
+
+class EntropyCache(object):
+    """Cache of entropies indexed by the rank of the subsets of variables.
+
+    The O-info of a multiplet of size k needs the entropies of its
+    leave-one-out subsets which are the multiplets of size k-1. Caching them
+    makes each entropy H(X_S) computed once for a range of multiplet sizes.
+
+    The subsets of each size are ranked with the combinatorial number system
+    (colexicographic order) and the entropies are stored in a single array,
+    so that batches of subsets are looked up and stored without a per-subset
+    Python overhead. The cached ranks of each size are kept sorted and
+    searched, so that the memory of the cache grows with the number of
+    entropies it holds and not with the number of possible subsets.
+
+    Parameters
+    ----------
+    max_entries : int | None
+        Maximum number of entropies to keep. When the cache is full, the least
+        recently used entropies are evicted. If None, the cache is unbounded.
+    """
+
+    def __init__(self, max_entries=None):
+        if (max_entries is not None) and not (
+                isinstance(max_entries, (int, np.integer)) and
+                not isinstance(max_entries, bool) and max_entries > 0):
+            raise ValueError("max_entries should be None or a positive "
+                             f"integer, got {max_entries!r}")
+        self.max_entries = max_entries
+        self.clear()
+
+    def __len__(self):
+        return self._n_entries
+
+    def __contains__(self, key):
+        sub = self._subsets([key])
+        return bool(self._slots_of(sub)[0] >= 0)
+
+    def __repr__(self):
+        return (f"EntropyCache(entries={len(self)}, hits={self.hits}, "
+                f"misses={self.misses}, evictions={self.evictions})")
+
+    def _subsets(self, keys):
+        """Sorted subsets of shape (n_keys, k)."""
+        sub = np.asarray(keys, dtype=np.int64)
+        if sub.ndim == 1:
+            sub = sub[np.newaxis]
+        return np.sort(sub, axis=-1)
+
+    def _ranks(self, sub):
+        """Colexicographic ranks sum_i C(s_i, i + 1) of sorted subsets."""
+        n_sub, k = sub.shape
+        if not n_sub:
+            return np.zeros((0,), dtype=np.int64)
+        n = max(int(sub.max()) + 1, self._binom.shape[0])
+        k_max = max(k, self._binom.shape[1] - 1)
+        if self._binom.shape != (n, k_max + 1):
+            self._binom = np.array(
+                [[comb(d, m, exact=True) for m in range(k_max + 1)]
+                 for d in range(n)], dtype=np.int64)
+        return self._binom[sub, np.arange(1, k + 1)].sum(-1)
+
+    def ranks(self, keys):
+        """Get the ranks of subsets of the same size.
+
+        Parameters
+        ----------
+        keys : array_like
+            Subsets of variable indices, of shape (n_keys, k).
+
+        Returns
+        -------
+        ndarray
+            Colexicographic ranks of the subsets, of shape (n_keys,).
+        """
+        return self._ranks(self._subsets(keys))
+
+    def _slots_of(self, sub, ranks=None):
+        """Slots of the subsets in the storage, -1 if not cached."""
+        ranks = self._ranks(sub) if ranks is None else ranks
+        slots = np.full(len(sub), -1, dtype=np.int64)
+        index = self._index.get(sub.shape[1])
+        if index is not None and len(index[0]):
+            cached, cached_slots = index
+            pos = np.minimum(np.searchsorted(cached, ranks), len(cached) - 1)
+            is_in = cached[pos] == ranks
+            slots[is_in] = cached_slots[pos[is_in]]
+        return slots
+
+    def get(self, keys):
+        """Get the entropies of several subsets of the same size.
+
+        Parameters
+        ----------
+        keys : array_like
+            Subsets of variable indices, of shape (n_keys, k).
+
+        Returns
+        -------
+        values : ndarray
+            Cached entropies of the subsets that are found, of shape
+            (n_found, ...).
+        found : ndarray
+            Boolean array of shape (n_keys,), True for the subsets in the
+            cache.
+        """
+        slots = self._slots_of(self._subsets(keys))
+        found = slots >= 0
+        n_found = int(found.sum())
+        self.hits += n_found
+        self.misses += len(found) - n_found
+        if self._values is None:
+            return np.zeros((0,)), found
+
+        self._clock += 1
+        self._last_used[slots[found]] = self._clock
+        return self._values[slots[found]], found
+
+    def set(self, keys, values):
+        """Add the entropies of several subsets of the same size.
+
+        Parameters
+        ----------
+        keys : array_like
+            Subsets of variable indices, of shape (n_keys, k).
+        values : array_like
+            Entropies of each subset, of shape (n_keys, ...).
+        """
+        sub = self._subsets(keys)
+        values = np.asarray(values)
+        if not len(sub):
+            return
+        ranks, first = np.unique(self._ranks(sub), return_index=True)
+        sub, values = sub[first], values[first]
+        if self._values is None:
+            self._values = np.zeros((0,) + values.shape[1:])
+        self._clock += 1
+
+        # update the subsets that are already cached
+        slots = self._slots_of(sub, ranks)
+        is_new = slots < 0
+        self._values[slots[~is_new]] = values[~is_new]
+        self._last_used[slots[~is_new]] = self._clock
+        ranks, values = ranks[is_new], values[is_new]
+
+        # only keep the last max_entries new subsets and evict the least
+        # recently used ones
+        if self.max_entries is not None:
+            n_drop = len(ranks) - self.max_entries
+            if n_drop > 0:
+                ranks, values = ranks[n_drop:], values[n_drop:]
+                self.evictions += n_drop
+            self._evict(self._n_entries + len(ranks) - self.max_entries)
+
+        # store the new subsets in free slots
+        free = np.flatnonzero(self._size == 0)
+        if len(free) < len(ranks):
+            self._grow(len(ranks) - len(free))
+            free = np.flatnonzero(self._size == 0)
+        slots = free[:len(ranks)]
+        k = sub.shape[1]
+        cached, cached_slots = self._index.get(k, (
+            np.zeros((0,), dtype=np.int64), np.zeros((0,), dtype=np.int64)))
+        pos = np.searchsorted(cached, ranks)
+        self._index[k] = (np.insert(cached, pos, ranks),
+                          np.insert(cached_slots, pos, slots))
+        self._values[slots] = values
+        self._size[slots], self._rank[slots] = k, ranks
+        self._last_used[slots] = self._clock
+        self._n_entries += len(ranks)
+
+    def _evict(self, n_evict):
+        """Remove the n_evict least recently used entropies."""
+        if n_evict <= 0:
+            return
+        used = np.flatnonzero(self._size > 0)
+        old = used[np.argpartition(self._last_used[used], n_evict - 1)[
+            :n_evict]]
+        for k in np.unique(self._size[old]):
+            cached, cached_slots = self._index[k]
+            keep = ~np.isin(cached_slots, old)
+            self._index[k] = (cached[keep], cached_slots[keep])
+        self._size[old] = 0
+        self._n_entries -= n_evict
+        self.evictions += n_evict
+
+    def _grow(self, n_min):
+        """Add at least n_min free slots to the storage."""
+        n_slots = len(self._size)
+        n_add = max(n_min, n_slots)
+        if self.max_entries is not None:
+            n_add = max(min(n_add, self.max_entries - n_slots), n_min)
+        self._values = np.concatenate((self._values, np.zeros(
+            (n_add,) + self._values.shape[1:])))
+        self._size = np.r_[self._size, np.zeros(n_add, dtype=np.int64)]
+        self._rank = np.r_[self._rank, np.zeros(n_add, dtype=np.int64)]
+        self._last_used = np.r_[self._last_used,
+                                np.zeros(n_add, dtype=np.int64)]
+
+    def clear(self):
+        """Remove all the entropies and reset the statistics."""
+        self.hits, self.misses, self.evictions = 0, 0, 0
+        self._n_entries, self._clock = 0, 0
+        # sorted ranks of the cached subsets of each size and their slots
+        self._index = dict()
+        # entropies, subset size (0 for free slots), rank and last use of
+        # each slot
+        self._values = None
+        self._size = np.zeros((0,), dtype=np.int64)
+        self._rank = np.zeros((0,), dtype=np.int64)
+        self._last_used = np.zeros((0,), dtype=np.int64)
+        self._binom = np.ones((1, 1), dtype=np.int64)
@@ -3,19 +3,213 @@
 # Modified: Christian Ferreyra, chrisferreyra13@gmail.com
 # Date: 01/2023
 
+import os
+import tempfile
+
 import numpy as np
 import xarray as xr
+from joblib import cpu_count, dump, load
+from scipy.special import comb
 
-from frites.conn import conn_io
 from frites.io import logger, check_attrs
-from frites.core import copnorm_nd
+from frites.utils import parallel_func
+
+from ..backend import get_kernel
+from ..entropy.entropy_gaussian import (cov_gauss_sub_nd, entropy_gauss_nd,
+                                        entropy_gauss_sub_nd)
+from .cache import EntropyCache
+from .utils import (CombinationIndex, get_chunk_size, get_shard_range,
+                    join_labels)
+from .oinfo import compute_oinfo, compute_oinfo_cov, compute_oinfo_chol
+from .prepared import _get_hoi_data
+
+
+def _oinfo_nbytes(x, nvars, method):
+    """Approximate memory needed to compute the O-info of one multiplet."""
+    n_times, _, n_trials = x.shape
+    if method == 'chol':
+        # covariance, its cholesky factor and inverse, and the temporaries
+        # of each matrix (log-determinants, entropies and failure flags)
+        n_el = 4 * nvars ** 2 + 8
+    elif method == 'cov':
+        # covariance, leave-one-out sub-blocks and their cholesky factors
+        n_el = 2 * (nvars ** 2 + nvars * (nvars - 1) ** 2 + nvars)
+    else:
+        # multiplet data and leave-one-out copies
+        n_el = nvars ** 2 * n_trials + 2 * (nvars + 1) * nvars ** 2
+    return n_times * n_el * x.dtype.itemsize
+
+
+def _oinfo_batch(x, mult, ind, method, on_error='raise',
+                 return_failed=False):
+    """O-info of a batch of multiplets of shape (n_times, n_mult).
+
+    With return_failed, the boolean array of the O-info computed from a
+    covariance that is not positive definite is also returned.
+    """
+    kernel = get_kernel('oinfo_batch')
+    if (kernel is not None) and (method in ['cov', 'chol']):
+        # compiled kernel of the backend, NaN for the failed covariances
+        oinfo = np.array(kernel(x, mult), dtype=float)
+        failed = np.isnan(oinfo)
+        if failed.any():
+            if on_error == 'raise':
+                raise np.linalg.LinAlgError("Matrix is not positive definite")
+            t_idx, m_idx = np.nonzero(failed)
+            c = x[t_idx[:, np.newaxis, np.newaxis],
+                  mult[m_idx, :, np.newaxis], mult[m_idx, np.newaxis, :]]
+            oinfo[failed] = compute_oinfo_cov(c, ind, on_error=on_error)
+    elif method == 'cov':
+        oinfo, failed = compute_oinfo_cov(
+            cov_gauss_sub_nd(x, mult), ind, on_error=on_error,
+            return_failed=True)
+    elif method == 'chol':
+        oinfo, failed = compute_oinfo_chol(
+            cov_gauss_sub_nd(x, mult), on_error=on_error, return_failed=True)
+    else:
+        oinfo, failed = compute_oinfo(x[:, mult, :], ind, on_error=on_error,
+                                      return_failed=True)
+    return (oinfo, failed) if return_failed else oinfo
+
+
+def _n_jobs(n_jobs):
+    """Get the effective number of jobs."""
+    return cpu_count() + 1 + n_jobs if n_jobs < 0 else n_jobs
+
+
+def _as_memmap(x, folder):
+    """Dump an array into a read-only memmap to share it across processes."""
+    fname = os.path.join(folder, 'x.mmap')
+    dump(x, fname)
+    return load(fname, mmap_mode='r')
+
+
+def _entropy_subsets(x, sub, method, on_error='raise', return_failed=False):
+    """Entropies of subsets (n_sub, n_vars) of shape (n_times, n_sub)."""
+    if method == 'cov':
+        return entropy_gauss_sub_nd(x, sub, on_error=on_error,
+                                    return_failed=return_failed)
+    else:
+        return entropy_gauss_nd(x[:, sub, :], on_error=on_error,
+                                return_failed=return_failed)
+
+
+def _entropy_cached(x, sub, method, cache, on_error='raise'):
+    """Entropies of subsets (n_sub, n_vars) taken from the cache."""
+    # the same subset can appear several times in a batch
+    sub = np.sort(sub, axis=-1)
+    _, first, inverse = np.unique(cache.ranks(sub), return_index=True,
+                                  return_inverse=True)
+    sub = sub[first]
+    h_found, found = cache.get(sub)
+    h = np.empty((len(sub), x.shape[0]))
+    h[found] = h_found
+
+    # compute and cache the missing entropies
+    if not found.all():
+        h_miss = _entropy_subsets(x, sub[~found], method, on_error).T
+        cache.set(sub[~found], h_miss)
+        h[~found] = h_miss
+
+    return h.T[:, inverse.ravel()]
+
+
+def _oinfo_cached(x, mult, ind, method, cache, store=True,
+                  on_error='raise', return_failed=False):
+    """O-info of a batch of multiplets using cached subset entropies."""
+    n_mult, nvars = mult.shape
+    # joint entropy of the multiplets, cached for the next size. Their
+    # subsets can only fail with them
+    h, failed = _entropy_subsets(x, mult, method, on_error, True)
+    if store:
+        cache.set(mult, h.T)
+
+    # single variables and leave-one-out subsets (n_times, n_mult, n_vars)
+    h_single = _entropy_cached(x, mult.reshape(-1, 1), method, cache,
+                               on_error)
+    h_ind = _entropy_cached(x, mult[:, ind].reshape(-1, nvars - 1), method,
+                            cache, on_error)
+    h_single = h_single.reshape(-1, n_mult, nvars)
+    h_ind = h_ind.reshape(-1, n_mult, nvars)
+
+    oinfo = (nvars - 2) * h + (h_single - h_ind).sum(-1)
+    return (oinfo, failed) if return_failed else oinfo
+
+
+def _report_failures(counts, n_mult, what, on_error):
+    """Log the O-info computed from covariances that are not positive definite.
+
+    counts is the number of failed O-info of each time point and n_mult the
+    number of multiplets with at least one failure. Returns the total number
+    of failed O-info.
+    """
+    n_failed = int(counts.sum())
+    if n_failed:
+        logger.warning(
+            f"    {n_failed} {what} of {n_mult} multiplets and "
+            f"{int((counts > 0).sum())} time points were computed from "
+            f"covariances that are not positive definite "
+            f"(on_error='{on_error}')")
+    return n_failed
+
+
+def _tail_score(oinfo, tail):
+    """Score used to rank the O-info of a tail."""
+    if tail == 'abs':
+        score = np.abs(oinfo)
+    elif tail == 'redundancy':
+        score = oinfo.copy()
+    else:
+        score = -oinfo
+    score[np.isnan(score)] = -np.inf
+    return score
+
 
-from .utils import get_combinations
-from .oinfo import compute_oinfo
+def _merge_top_k(best, oinfo, ranks, top_k, tail):
+    """Merge a batch of O-info with the top_k ones of each time point."""
+    oinfo = np.concatenate((best[0], oinfo), 1)
+    ranks = np.concatenate((best[1], np.broadcast_to(ranks, oinfo.shape[:1] +
+                                                     ranks.shape)), 1)
+    if oinfo.shape[1] > top_k:
+        sel = np.argpartition(-_tail_score(oinfo, tail), top_k - 1, axis=1)
+        sel = sel[:, :top_k]
+        oinfo = np.take_along_axis(oinfo, sel, 1)
+        ranks = np.take_along_axis(ranks, sel, 1)
+    return oinfo, ranks
+
+
+def _multiplet_coords(ranks, sizes, dims, roi, roi_coords, is_task_related):
+    """Coordinates of the multiplets from their ranks.
+
+    sizes is a list of (offset, CombinationIndex) for each multiplet size.
+    The regions of the multiplets are padded with -1 and, for task-related
+    HOI, the behaviour is always in the last column.
+    """
+    dtype = np.min_scalar_type(-len(roi))
+    k_max = sizes[-1][1].k
+    width = k_max + int(is_task_related)
+    members = np.full(ranks.shape + (width,), -1, dtype=dtype)
+    msize = np.zeros(ranks.shape, dtype=dtype)
+    i_size = np.searchsorted([o for o, _ in sizes], ranks, side='right') - 1
+    for n_s, (offset, idx) in enumerate(sizes):
+        is_size = i_size == n_s
+        combs = idx.unrank(ranks[is_size] - offset)
+        members[is_size, :idx.k] = combs[:, :idx.k]
+        members[is_size, k_max:] = combs[:, idx.k:]
+        msize[is_size] = idx.k
+
+    if roi_coords == 'str':
+        return {'roi': (dims, join_labels(roi, members))}
+    coords = {'roi': (dims, ranks), 'msize': (dims, msize)}
+    coords.update({f'member_{k}': (dims, members[..., k])
+                   for k in range(width)})
+    return coords
 
 
 def conn_hoi(data, y=None, times=None, roi=None, minsize=3, maxsize=5,
-             verbose=None):
+             method='cov', max_memory='10MB', cache=False, n_jobs=1,
+             shard=None, roi_coords='str', top_k=None, tail='abs',
+             threshold=None, on_error='raise', dtype=None, verbose=None):
     """Dynamic, possibly task-related, higher-order interactions.
 
     Parameters
@@ -26,6 +220,9 @@ def conn_hoi(data, y=None, times=None, roi=None, minsize=3, maxsize=5,
             * Standard NumPy arrays of shape (n_epochs, n_roi, n_times)
             * mne.Epochs
             * xarray.DataArray of shape (n_epochs, n_roi, n_times)
+            * :class:`HOIData`, to reuse the copnormed data and covariance
+              across calls. In that case, y, roi, times and dtype are
+              taken from it.
 
     y : array_like
         The feature of shape (n_trials,) for estimating task-related O-info.
@@ -35,55 +232,154 @@ def conn_hoi(data, y=None, times=None, roi=None, minsize=3, maxsize=5,
         Array of time points of shape (n_times,)
     minsize, maxsize : int | 3, 5
         Minimum and maximum size of the multiplets
+    method : {'cov', 'chol', 'data'}
+        Use either 'cov' to compute the covariance of all the regions once per
+        time point and take the entropies of each multiplet from sub-blocks of
+        it, 'chol' to also derive the leave-one-out entropies from a single
+        cholesky factorization of each multiplet covariance (see
+        :func:`compute_oinfo_chol`), or 'data' to compute the entropies from
+        the trials of each multiplet. All give the same results but 'cov' and
+        'chol' only go through the trials once.
+    max_memory : int | str | '10MB'
+        Memory budget used to evaluate the multiplets of the same size in
+        batches. It can be given in bytes or as a string (e.g. '500MB', '2GB').
+        Note that batches that don't fit in the CPU cache are not faster.
+    cache : bool | int | False
+        If True, the entropies of the subsets of variables are cached so that
+        the leave-one-out entropies of a multiplet of size k are reused from
+        the multiplets of size k-1. Each entropy is then computed once for the
+        whole range of sizes. A positive int sets the maximum number of cached
+        entropies, the least recently used ones being evicted. The cache
+        only helps when several consecutive sizes are computed, especially
+        with the 'data' method where each entropy goes through the trials.
+        With 'cov', it roughly halves the computation time when the cache
+        holds all of the entropies but a small cache mostly evicts entropies
+        before they are reused. The cache is not used with the 'chol' method
+        which doesn't compute the entropies of the subsets.
+    n_jobs : int | 1
+        Number of jobs to use for parallel computing (use -1 to use all
+        jobs). The multiplets are split in batches that are dispatched to the
+        workers, the copnormed data (or its covariance) being shared through a
+        memory-mapped file. The cache is not used in parallel.
+    shard : tuple | None
+        Tuple (i, n_shards) to only compute the i-th of n_shards contiguous
+        parts of the multiplets, for example on several machines. The
+        multiplets are ranked size after size and following the lexicographic
+        order of :func:`itertools.combinations`. The partial results can be
+        merged with :func:`merge_hoi_shards`.
+    roi_coords : {'str', 'int'}
+        Use either 'str' to name the multiplets by joining the names of their
+        regions (e.g. 'r0-r1-r2') or 'int' to describe them with integers.
+        In that case, the 'roi' coordinate is the rank of the multiplet,
+        'msize' its size and 'member_0', 'member_1', ... the indices of its
+        regions in the 'roi_names' attribute (padded with -1). 'msize' is the
+        number of regions, without the behaviour of task-related HOI which
+        is always in the last 'member_*' coordinate. See
+        :func:`get_multiplet_labels` and :func:`select_multiplets`.
+    top_k : int | None
+        Only keep the top_k multiplets of each time point. The batches of
+        multiplets are merged on the fly into a buffer of top_k values per
+        time point, so the memory doesn't depend on the number of multiplets.
+    tail : {'abs', 'both'}
+        Use either 'abs' to keep the top_k multiplets with the largest
+        absolute O-info or 'both' to keep separately the top_k most redundant
+        (largest O-info) and the top_k most synergistic (smallest O-info).
+    threshold : float | None
+        Only keep the O-info values whose absolute value is greater or equal to
+        the threshold, as a sparse array. It can't be used with top_k.
+    on_error : {'raise', 'nan', 'ridge', 'slogdet'}
+        What to do when a covariance is not positive definite (e.g. a rank
+        deficient time point). With 'raise', the whole computation stops.
+        Otherwise, only the failing covariances are processed again, either
+        to give them a NaN O-info, to regularize them or to use slogdet
+        instead of the cholesky decomposition (see
+        :func:`itpg.entropy.logdet_nd`). The number of O-info values computed
+        from such covariances is logged once for the run and stored in the
+        'n_failed' attribute.
+    dtype : {'float64', 'float32'} | None
+        Precision used to store the copnormed data and the covariances, and
+        to compute the products and factorizations. With 'float32', the
+        covariance is accumulated in double precision over blocks of trials
+        (see :func:`itpg.entropy.cov_gauss_nd`) and the log-determinants are
+        summed in double precision. This halves the memory and allows twice
+        larger batches for a given max_memory. Compared to 'float64', the
+        O-info error is of the order of n_vars * cond * 1e-7 nats, cond being
+        the condition number of the multiplet covariance, e.g. below 1e-4
+        nats for moderately correlated regions. If None, 'float64' is used,
+        or the dtype of the HOIData.
 
     Returns
     -------
     oinfo : array_like
         The O-info array of shape (n_multiplets, n_times) where positive values
         reflect redundant dominated interactions and negative values stand for
-        synergistic dominated interactions.
+        synergistic dominated interactions. With top_k, the array has a shape
+        of (top_k, n_times), or (2, top_k, n_times) with tail='both', sorted
+        by decreasing score and the 'roi' coordinate gives the multiplet of
+        each value. With a threshold, the array has a shape of (n_values,)
+        and the 'times' and 'roi' coordinates give the time point and the
+        multiplet of each value, the values being sorted by multiplet and
+        then by time point.
     """
     # ________________________________ INPUTS _________________________________
-    # inputs conversion
-    is_task_related = isinstance(y, (str, list, np.ndarray, tuple))
-    kw_links = {'directed': False, 'net': False}
-    data, cfg = conn_io(
-        data, y=y, times=times, roi=roi, name='DynOinfo', verbose=verbose,
-        kw_links=kw_links
-    )
-
-    # extract variables
-    x, attrs = data.data, cfg['attrs']
-    y, roi, times = data['y'].data, data['roi'].data, data['times'].data
-    n_roi = len(roi)
+    prep = _get_hoi_data(data, y=y, times=times, roi=roi, dtype=dtype,
+                         verbose=verbose)
+    x, roi, times, dtype = prep.x, prep.roi, prep.times, prep.dtype
+    attrs, is_task_related = dict(prep.attrs), prep.is_task_related
+    n_roi = len(roi) - int(is_task_related)
 
     # get the maximum size of the multiplets investigated
     if not isinstance(maxsize, int):
         maxsize = n_roi
     maxsize = max(1, maxsize)
     assert maxsize > minsize
+    assert method in ['cov', 'chol', 'data'], (
+        "method should be 'cov', 'chol' or 'data'")
+    assert roi_coords in ['str', 'int'], "roi_coords should be 'str' or 'int'"
+    assert tail in ['abs', 'both'], "tail should be 'abs' or 'both'"
+    assert (top_k is None) or (threshold is None), (
+        "top_k and threshold can't be used together")
+    if not (isinstance(cache, bool) or (
+            isinstance(cache, (int, np.integer)) and cache > 0)):
+        raise ValueError("cache should be True, False or a positive number "
+                         f"of entries, got {cache!r}")
+    if (method == 'chol') or (n_jobs != 1) or (cache is False):
+        cache = None
+    elif cache is True:
+        cache = EntropyCache()
+    else:
+        cache = EntropyCache(max_entries=int(cache))
 
     logger.info(f"Compute the {'task-related ' * is_task_related} HOI "
                 f"(min={minsize}; max={maxsize})")
 
     # ________________________________ O-INFO _________________________________
-    logger.info("    Copnorm the data")
-
-    # for task-related, add behavior along spatial dimension
-    if is_task_related:
-        y = np.tile(y.reshape(-1, 1, 1), (1, 1, len(times)))
-        x = np.concatenate((x, y), axis=1)
-        roi = np.r_[roi, ['beh']]
+    # full covariance of shape (n_times, n_roi, n_roi)
+    if method in ['cov', 'chol']:
+        c = prep.cov
+    else:
+        x = prep.data
 
-    # copnorm and demean the data
-    x = copnorm_nd(x.copy(), axis=0)
-    x = (x - x.mean(axis=0, keepdims=True))
+    # ranks of the multiplets computed by the shard
+    n_mult = [comb(n_roi, msize, exact=True)
+              for msize in range(minsize, maxsize + 1)]
+    start, stop = 0, sum(n_mult)
+    if shard is not None:
+        start, stop = get_shard_range(sum(n_mult), shard)
+        logger.info(f"    Shard {shard[0]} of {shard[1]} (multiplets "
+                    f"[{start}, {stop}[)")
 
-    # make the data (n_times, n_roi, n_trials)
-    x = x.transpose(2, 1, 0)
+    tasks, sizes, offset = [], [], 0
+    for msize, _n_mult in zip(range(minsize, maxsize + 1), n_mult):
+        idx = CombinationIndex(
+            n_roi, msize, target=n_roi if is_task_related else None)
+        sizes += [(offset, idx)]
+        _start = min(max(start - offset, 0), _n_mult)
+        _stop = min(max(stop - offset, 0), _n_mult)
+        offset += _n_mult
+        if _start == _stop:
+            continue
 
-    oinfo, roi_o = [], []
-    for msize in range(minsize, maxsize + 1):
         # ------------------------------ INDICES ------------------------------
         ish = msize if not is_task_related else msize + 1
         ind = np.zeros((ish, ish), dtype=int)
@@ -94,23 +390,189 @@ def conn_hoi(data, y=None, times=None, roi=None, minsize=3, maxsize=5,
 
         # ----------------------------- MULTIPLETS ----------------------------
         logger.info(f"    Multiplets of size {msize}")
-        combs, _roi_o = get_combinations(
-            n_roi, msize, roi, task_related=is_task_related)
-        roi_o += _roi_o
 
-        # ------------------------------- O-INFO ------------------------------
-        for mult in combs:
-            _oinfo = compute_oinfo(x[:, mult, :], ind)
-            oinfo += [_oinfo]
-    oinfo = np.stack(oinfo, 0)
+        # batches of multiplets (n_times, n_chunk, ...)
+        n_chunk = get_chunk_size(
+            max_memory, _oinfo_nbytes(x, ish, method), _stop - _start)
+        if n_jobs != 1:
+            # at least one batch per job
+            n_chunk = min(n_chunk, -(-(_stop - _start) // _n_jobs(n_jobs)))
+        tasks += [(idx, k, min(k + n_chunk, _stop), ind, msize < maxsize,
+                   sizes[-1][0] + k) for k in range(_start, _stop, n_chunk)]
+
+    # ------------------------------- O-INFO ----------------------------------
+    # the multiplets of each batch are only built when it is computed
+    x = c if method in ['cov', 'chol'] else x
+    tails = ['redundancy', 'synergy'] if tail == 'both' else [tail]
+    best = {t: (np.zeros((len(times), 0)), np.zeros((len(times), 0), int))
+            for t in tails}
+    oinfo, ranks, t_idx = [], [], []
+    # number of failed O-info of each time point and failed multiplets
+    n_failed, n_failed_mult = np.zeros((len(times),), dtype=int), 0
+    with tempfile.TemporaryDirectory() as folder:
+        if cache is not None:
+            batches = (_oinfo_cached(x, idx[k:k_end], ind, method, cache,
+                                     store, on_error, True)
+                       for idx, k, k_end, ind, store, _ in tasks)
+        elif n_jobs == 1:
+            batches = (_oinfo_batch(x, idx[k:k_end], ind, method, on_error,
+                                    True)
+                       for idx, k, k_end, ind, _, _ in tasks)
+        else:
+            # share the data with the workers through a memmap
+            logger.info(f"    Compute the O-info (n_jobs={n_jobs})")
+            parallel, p_fun = parallel_func(
+                _oinfo_batch, n_jobs=n_jobs, verbose=verbose,
+                total=len(tasks), mesg='Estimating O-info',
+                return_as='generator')
+            x = _as_memmap(x, folder)
+            batches = parallel(p_fun(x, idx[k:k_end], ind, method, on_error,
+                                     True)
+                               for idx, k, k_end, ind, _, _ in tasks)
+
+        # stream over the batches (n_times, n_chunk)
+        for (_, k, k_end, _, _, rank), batch in zip(tasks, batches):
+            _oinfo, _failed = batch
+            n_failed += _failed.sum(1)
+            n_failed_mult += int(_failed.any(0).sum())
+            _ranks = np.arange(rank, rank + k_end - k)
+            if top_k is not None:
+                for t in tails:
+                    best[t] = _merge_top_k(best[t], _oinfo, _ranks, top_k, t)
+            elif threshold is not None:
+                # sorted by multiplet then time, whatever the batches
+                _m_idx, _t_idx = np.nonzero(np.abs(_oinfo.T) >= threshold)
+                oinfo += [_oinfo[_t_idx, _m_idx]]
+                ranks += [_ranks[_m_idx]]
+                t_idx += [_t_idx]
+            else:
+                oinfo += [_oinfo]
+        del x
+
+    if cache is not None:
+        logger.info(f"    {cache}")
+    if on_error != 'raise':
+        n_failed = _report_failures(n_failed, n_failed_mult, 'O-info values',
+                                    on_error)
 
     # _______________________________ OUTPUTS _________________________________
+    if top_k is not None:
+        # sort the multiplets of each time point (top_k, n_times)
+        for t in tails:
+            score = _tail_score(best[t][0], t)
+            order = np.argsort(-score, axis=1, kind='stable')
+            best[t] = [np.take_along_axis(b, order, 1).T for b in best[t]]
+        oinfo = np.stack([best[t][0] for t in tails])
+        ranks = np.stack([best[t][1] for t in tails])
+        dims, coords = ('tail', 'top', 'times'), {
+            'tail': tails, 'top': np.arange(oinfo.shape[1]), 'times': times}
+        if tail != 'both':
+            oinfo, ranks, dims = oinfo[0], ranks[0], dims[1:]
+            coords.pop('tail')
+    elif threshold is not None:
+        # sparse (COO) O-info of shape (n_values,)
+        oinfo = np.concatenate([np.zeros((0,))] + oinfo)
+        ranks = np.concatenate([np.zeros((0,), int)] + ranks)
+        t_idx = np.concatenate([np.zeros((0,), int)] + t_idx)
+        dims, coords = ('nnz',), {'times': ('nnz', times[t_idx])}
+    else:
+        oinfo = np.concatenate([np.zeros((len(times), 0))] + oinfo, 1).T
+        ranks = np.arange(start, stop)
+        dims, coords = ('roi', 'times'), {'times': times}
+    coords.update(_multiplet_coords(
+        ranks, sizes, dims[:ranks.ndim], roi, roi_coords, is_task_related))
+
     attrs.update(dict(
         task_related=is_task_related, minsize=minsize, maxsize=maxsize
     ))
+    if roi_coords == 'int':
+        attrs['roi_names'] = list(roi)
+    if top_k is not None:
+        attrs.update(dict(top_k=top_k, tail=tail))
+    if threshold is not None:
+        attrs['threshold'] = threshold
+    if on_error != 'raise':
+        attrs.update(dict(on_error=on_error, n_failed=n_failed))
+    if dtype != 'float64':
+        attrs['dtype'] = dtype
+    if shard is not None:
+        attrs.update(dict(
+            shard=shard[0], n_shards=shard[1], shard_start=start,
+            shard_stop=stop
+        ))
     oinfo = xr.DataArray(
-        oinfo, dims=('roi', 'times'), coords=(roi_o, times), name="Oinfo",
+        oinfo, dims=dims, coords=coords, name="Oinfo",
         attrs=check_attrs(attrs)
     )
 
     return oinfo
+
+
+def merge_hoi_shards(shards):
+    """Merge the partial O-info computed by the shards of conn_hoi.
+
+    Parameters
+    ----------
+    shards : list
+        List of the O-info DataArrays returned by :func:`conn_hoi` with the
+        shard input, or paths to those DataArrays saved as netcdf files.
+
+    Returns
+    -------
+    oinfo : array_like
+        The O-info array with the same shape, coordinates and attributes as
+        a single conn_hoi run. With top_k, the top_k multiplets of each time
+        point are selected among the ones of all of the shards. With a
+        threshold, the values of the shards are concatenated. The 'n_failed'
+        attribute is the total of the shards.
+    """
+    shards = [xr.load_dataarray(s) if isinstance(s, (str, os.PathLike))
+              else s for s in shards]
+    shards = sorted(shards, key=lambda s: int(s.attrs['shard']))
+
+    # check that all the shards are there and contiguous
+    n_shards = int(shards[0].attrs['n_shards'])
+    idx = [int(s.attrs['shard']) for s in shards]
+    if idx != list(range(n_shards)):
+        raise ValueError(f"Expected the shards {list(range(n_shards))}, got "
+                         f"{idx}")
+    for s_prev, s_next in zip(shards[:-1], shards[1:]):
+        assert s_prev.attrs['shard_stop'] == s_next.attrs['shard_start']
+
+    attrs = {k: v for k, v in shards[0].attrs.items() if k not in
+             ['shard', 'n_shards', 'shard_start', 'shard_stop']}
+    if 'n_failed' in attrs:
+        attrs['n_failed'] = sum(int(s.attrs['n_failed']) for s in shards)
+    if 'top_k' in attrs:
+        oinfo = _merge_top_k_shards(shards, int(attrs['top_k']))
+    elif 'threshold' in attrs:
+        # thresholded values of all of the shards
+        oinfo = xr.concat(shards, 'nnz', combine_attrs='override')
+    else:
+        oinfo = xr.concat(shards, 'roi', combine_attrs='override')
+    oinfo.attrs = attrs
+
+    return oinfo
+
+
+def _merge_top_k_shards(shards, top_k):
+    """Keep the top_k multiplets of each time point across shards."""
+    oinfo = xr.concat([s.drop_vars('top') for s in shards], 'top',
+                      combine_attrs='override')
+    axis = oinfo.dims.index('top')
+    if 'tail' in oinfo.dims:
+        tails, data = list(oinfo['tail'].data), oinfo.data
+    else:
+        tails, data = [oinfo.attrs['tail']], oinfo.data[np.newaxis]
+    score = np.stack([_tail_score(d, t) for d, t in zip(data, tails)])
+    order = np.argsort(-score, axis=-2, kind='stable')[..., :top_k, :]
+    order = order.reshape(oinfo.shape[:axis] + order.shape[-2:])
+
+    # the data and the coordinates of the multiplets follow the same order
+    take = {k: (c.dims, np.take_along_axis(c.data, order, axis))
+            for k, c in oinfo.coords.items() if c.dims == oinfo.dims}
+    coords = {k: c for k, c in oinfo.coords.items() if 'top' not in c.dims}
+    coords.update(take)
+    coords['top'] = np.arange(order.shape[axis])
+    return xr.DataArray(np.take_along_axis(oinfo.data, order, axis),
+                        dims=oinfo.dims, coords=coords, name=oinfo.name)
@@ -0,0 +1,169 @@
+"""Beam search of higher order interactions."""
+# Authors: Christian Ferreyra, chrisferreyra13@gmail.com
+# Date: 2023
+# License: MIT License
+
+import numpy as np
+import xarray as xr
+
+from frites.io import logger, check_attrs
+
+from .conn_oinfo import _oinfo_batch, _oinfo_nbytes
+from .prepared import _get_hoi_data
+from .utils import CombinationIndex, get_chunk_size, join_labels
+
+
+CRITERIONS = ['synergy', 'redundancy', 'abs']
+
+
+def _score(oinfo, criterion, agg):
+    """Score of the multiplets from their O-info (n_mult, n_times)."""
+    if criterion == 'synergy':
+        oinfo = -oinfo
+    elif criterion == 'abs':
+        oinfo = np.abs(oinfo)
+    score = oinfo.mean(-1) if agg == 'mean' else oinfo.max(-1)
+    score[np.isnan(score)] = -np.inf
+    return score
+
+
+def _best_multiplets(c, chunks, beam_width, criterion, agg):
+    """Keep the beam_width best multiplets from chunks of candidates."""
+    mult, oinfo, score = None, None, None
+    for _mult in chunks:
+        _oinfo = _oinfo_batch(c, _mult, None, 'chol').T
+        _score_mult = _score(_oinfo, criterion, agg)
+        if mult is not None:
+            _mult = np.r_[mult, _mult]
+            _oinfo = np.r_[oinfo, _oinfo]
+            _score_mult = np.r_[score, _score_mult]
+        best = np.argsort(-_score_mult, kind='stable')[:beam_width]
+        mult, oinfo, score = _mult[best], _oinfo[best], _score_mult[best]
+
+    return mult, oinfo, score
+
+
+def _grow_multiplets(mult, n_roi, is_task_related):
+    """Get the unique multiplets made of a multiplet plus a region."""
+    target = mult[:, -1:] if is_task_related else mult[:, :0]
+    mult = mult[:, :mult.shape[1] - int(is_task_related)]
+
+    # add every region to every multiplet (n_mult * n_roi, msize + 1)
+    n_mult, msize = mult.shape
+    rois = np.tile(np.arange(n_roi), n_mult)
+    grown = np.c_[np.repeat(mult, n_roi, axis=0), rois]
+    is_new = (mult[:, np.newaxis, :] != np.arange(n_roi)[:, np.newaxis]).all(
+        -1).ravel()
+    grown = np.unique(np.sort(grown[is_new], axis=-1), axis=0)
+
+    return np.c_[grown, np.repeat(target[:1], len(grown), axis=0)]
+
+
+def conn_hoi_beam(data, y=None, times=None, roi=None, minsize=3, maxsize=8,
+                  beam_width=10, criterion='synergy', agg='mean',
+                  max_memory='10MB', verbose=None):
+    """Beam search of the most synergistic or redundant multiplets.
+
+    Instead of enumerating all of the multiplets, the search starts from the
+    beam_width best multiplets of size minsize and grows them by adding one
+    region at a time, only keeping the beam_width best multiplets of each
+    size. With beam_width=1, this is a greedy search that adds the region
+    with the best O-info gain.
+
+    Parameters
+    ----------
+    data : array_like
+        Electrophysiological data. Several input types are supported:
+
+            * Standard NumPy arrays of shape (n_epochs, n_roi, n_times)
+            * mne.Epochs
+            * xarray.DataArray of shape (n_epochs, n_roi, n_times)
+            * :class:`HOIData`, to reuse the copnormed data and covariance.
+              In that case, y, roi and times are taken from it.
+
+    y : array_like
+        The feature of shape (n_trials,) for estimating task-related O-info.
+    roi : array_like | None
+        Array of region of interest name of shape (n_roi,)
+    times : array_like | None
+        Array of time points of shape (n_times,)
+    minsize, maxsize : int | 3, 8
+        Minimum and maximum size of the multiplets. All of the multiplets of
+        size minsize are evaluated.
+    beam_width : int | 10
+        Number of multiplets kept for each size.
+    criterion : {'synergy', 'redundancy', 'abs'}
+        Look for either the most synergistic (smallest O-info), the most
+        redundant (largest O-info) multiplets or the ones with the largest
+        absolute O-info.
+    agg : {'mean', 'max'}
+        How the criterion is aggregated over the time points.
+    max_memory : int | str | '10MB'
+        Memory budget used to evaluate the multiplets in batches.
+
+    Returns
+    -------
+    oinfo : array_like
+        The O-info array of shape (n_multiplets, n_times) of the beam_width
+        best multiplets of each size, sorted by size and decreasing score.
+        The 'msize' and 'score' coordinates give the size and the score of
+        each multiplet.
+    """
+    # ________________________________ INPUTS _________________________________
+    prep = _get_hoi_data(data, y=y, times=times, roi=roi, verbose=verbose)
+    x, roi, times = prep.x, prep.roi, prep.times
+    attrs, is_task_related = dict(prep.attrs), prep.is_task_related
+    n_roi = len(roi) - int(is_task_related)
+    maxsize = min(maxsize, n_roi)
+    assert 1 <= minsize <= maxsize
+    assert criterion in CRITERIONS, f"criterion should be in {CRITERIONS}"
+    assert agg in ['mean', 'max'], "agg should be 'mean' or 'max'"
+
+    logger.info(f"Beam search of the {'task-related ' * is_task_related} HOI "
+                f"(min={minsize}; max={maxsize}; beam_width={beam_width})")
+
+    # ________________________________ O-INFO _________________________________
+    c = prep.cov
+
+    # exhaustive search for the smallest multiplets
+    logger.info(f"    Multiplets of size {minsize}")
+    idx = CombinationIndex(n_roi, minsize,
+                           target=n_roi if is_task_related else None)
+    nvars = minsize + int(is_task_related)
+    n_chunk = get_chunk_size(max_memory, _oinfo_nbytes(x, nvars, 'chol'),
+                             len(idx))
+    mult, oinfo, score = _best_multiplets(
+        c, idx.iter_chunks(chunk_size=n_chunk), beam_width, criterion, agg)
+    beams = [(mult, oinfo, score)]
+
+    # grow the best multiplets
+    for msize in range(minsize + 1, maxsize + 1):
+        logger.info(f"    Multiplets of size {msize}")
+        cand = _grow_multiplets(mult, n_roi, is_task_related)
+        n_chunk = get_chunk_size(
+            max_memory, _oinfo_nbytes(x, cand.shape[1], 'chol'), len(cand))
+        chunks = (cand[k:k + n_chunk] for k in range(0, len(cand), n_chunk))
+        mult, oinfo, score = _best_multiplets(
+            c, chunks, beam_width, criterion, agg)
+        beams += [(mult, oinfo, score)]
+
+    # _______________________________ OUTPUTS _________________________________
+    width = maxsize + int(is_task_related)
+    members = np.concatenate([np.pad(
+        m, ((0, 0), (0, width - m.shape[1])), constant_values=-1)
+        for m, _, _ in beams])
+    msize = np.concatenate([[m.shape[1] - int(is_task_related)] * len(m)
+                            for m, _, _ in beams])
+    attrs.update(dict(
+        task_related=is_task_related, minsize=minsize, maxsize=maxsize,
+        beam_width=beam_width, criterion=criterion, agg=agg
+    ))
+    oinfo = xr.DataArray(
+        np.concatenate([o for _, o, _ in beams]), dims=('roi', 'times'),
+        coords={'roi': join_labels(roi, members), 'times': times,
+                'msize': ('roi', msize),
+                'score': ('roi', np.concatenate([s for _, _, s in beams]))},
+        name="Oinfo", attrs=check_attrs(attrs)
+    )
+
+    return oinfo
@@ -0,0 +1,450 @@
+"""Surrogate testing and bootstrap of higher order interactions."""
+# Authors: Christian Ferreyra, chrisferreyra13@gmail.com
+# Date: 2023
+# License: MIT License
+
+import numpy as np
+import xarray as xr
+
+from frites.io import logger, check_attrs
+
+from ..entropy.entropy_gaussian import (cov_gauss_nd, cov_gauss_cross_nd,
+                                        cov_gauss_weighted_nd,
+                                        bootstrap_weights)
+from .conn_oinfo import (_oinfo_batch, _oinfo_nbytes, _report_failures,
+                         _tail_score, _multiplet_coords)
+from .prepared import _get_hoi_data, _hoi_data
+from .utils import CombinationIndex, get_chunk_size, parse_memory
+
+
+SURROGATES = ['shuffle', 'shift']
+
+
+def _surrogate_index(rng, n_surr, n_vars, n, surrogate):
+    """Indices of shape (n_surr, n_vars, n) of the surrogates.
+
+    With 'shuffle', the n trials of each variable are randomly permuted.
+    With 'shift', the n time points of each variable are circularly shifted
+    by a random number of time points.
+    """
+    if surrogate == 'shuffle':
+        return rng.random((n_surr, n_vars, n)).argsort(-1)
+    shift = rng.integers(1, n, size=(n_surr, n_vars, 1))
+    return (np.arange(n) + shift) % n
+
+
+def _surrogate_cov(prep, index, surrogate='shuffle'):
+    """Covariances of the surrogates of shape (n_times, n_surr, n, n).
+
+    For task-related HOI, only the trials of the behaviour are shuffled so
+    that the covariance of the regions is reused and the cross-covariances
+    of the behaviour of all of the surrogates are computed with a single
+    product. Otherwise, the trials (or the time points) of each region are
+    resampled and the covariance is computed once per surrogate.
+    """
+    x, y = prep.x, prep.y
+    n_roi = x.shape[1]
+    n_surr = len(index)
+    if y is None:
+        # (n_times, n_surr, n_roi, n_trials)
+        if surrogate == 'shuffle':
+            x_s = x[:, np.arange(n_roi)[:, np.newaxis], index]
+        else:
+            x_s = x[index.transpose(2, 0, 1), np.arange(n_roi), :]
+        return cov_gauss_nd(x_s)
+
+    y_s = y[index[:, 0, :]]
+    c = np.repeat(prep.cov[:, np.newaxis], n_surr, axis=1)
+    c_xy = cov_gauss_cross_nd(x, y_s.T).transpose(0, 2, 1)
+    c[..., :n_roi, -1] = c[..., -1, :n_roi] = c_xy
+    return c
+
+
+def conn_hoi_stats(data, y=None, times=None, roi=None, minsize=3, maxsize=5,
+                   n_perm=1000, surrogate='shuffle', tail='abs', alpha=0.05,
+                   max_memory='10MB', on_error='raise', random_state=None,
+                   verbose=None):
+    """Significance of the higher-order interactions against surrogates.
+
+    The O-info of all of the multiplets is compared to its null distribution
+    estimated from surrogate data. The copnorm and the covariance of the
+    data are computed once and the surrogates are obtained by shuffling the
+    trials or shifting the time points of the copnormed data, which is
+    equivalent to doing it on the data. Each surrogate then only costs a
+    covariance (or, for task-related HOI, a product with the shuffled
+    behaviour) and the O-info of the multiplets, computed from it for
+    batches of surrogates at once (see the 'chol' method of
+    :func:`conn_hoi`).
+
+    Parameters
+    ----------
+    data : array_like
+        Electrophysiological data. Several input types are supported:
+
+            * Standard NumPy arrays of shape (n_epochs, n_roi, n_times)
+            * mne.Epochs
+            * xarray.DataArray of shape (n_epochs, n_roi, n_times)
+            * :class:`HOIData`, to reuse the copnormed data and covariance.
+              In that case, y, roi and times are taken from it.
+
+    y : array_like
+        The feature of shape (n_trials,) for estimating task-related O-info.
+    roi : array_like | None
+        Array of region of interest name of shape (n_roi,)
+    times : array_like | None
+        Array of time points of shape (n_times,)
+    minsize, maxsize : int | 3, 5
+        Minimum and maximum size of the multiplets
+    n_perm : int | 1000
+        Number of surrogates.
+    surrogate : {'shuffle', 'shift'}
+        Use either 'shuffle' to randomly permute the trials of each region
+        independently or 'shift' to circularly shift the time series of
+        each region by its own random number of time points. The shift keeps
+        the temporal autocorrelation of each region and only breaks the
+        time-locked dependencies between the regions. For task-related HOI,
+        only the trials of the behaviour are shuffled, which tests the
+        dependency of the multiplets on the behaviour ('shift' can't be used
+        as the behaviour has no time axis).
+    tail : {'abs', 'redundancy', 'synergy'}
+        Test either the absolute O-info (two-sided), the redundancy (large
+        O-info) or the synergy (small O-info).
+    alpha : float | 0.05
+        Significance level of the corrected threshold.
+    max_memory : int | str | '10MB'
+        Memory budget used to evaluate the surrogates and the multiplets in
+        batches.
+    on_error : {'raise', 'nan', 'ridge', 'slogdet'}
+        What to do when a covariance is not positive definite (see
+        :func:`conn_hoi`). The numbers of O-info of the data and of the
+        surrogates computed from such covariances are stored in the
+        'n_failed' and 'n_failed_surrogates' attributes.
+    random_state : int | None
+        Seed of the random generator of the surrogates.
+
+    Returns
+    -------
+    stats : xarray.Dataset
+        Dataset of the multiplets (roi) and time points (times) with the
+        variables:
+
+            * 'oinfo' : the O-info of the data
+            * 'pvalues' : the uncorrected p-values of each multiplet and time
+              point
+            * 'pvalues_corr' : the p-values corrected for multiple
+              comparisons across the multiplets and time points using the
+              maximum statistics of the surrogates
+
+        The 'threshold' attribute is the corrected threshold at the alpha
+        level, the O-info being significant when its score (absolute value
+        with tail='abs', value with 'redundancy' and opposite value with
+        'synergy') is greater or equal to it.
+    """
+    # ________________________________ INPUTS _________________________________
+    prep = _get_hoi_data(data, y=y, times=times, roi=roi, verbose=verbose)
+    roi, times = prep.roi, prep.times
+    attrs, is_task_related = dict(prep.attrs), prep.is_task_related
+    n_times, n_roi, n_trials = prep.x.shape
+    maxsize = min(maxsize, n_roi) if isinstance(maxsize, int) else n_roi
+    assert 1 <= minsize <= maxsize
+    assert surrogate in SURROGATES, f"surrogate should be in {SURROGATES}"
+    if (surrogate == 'shift') and (is_task_related or n_times < 2):
+        raise ValueError("surrogate='shift' needs several time points and "
+                         "can't be used for task-related HOI")
+    assert tail in ['abs', 'redundancy', 'synergy'], (
+        "tail should be 'abs', 'redundancy' or 'synergy'")
+    assert n_perm >= 1
+    rng = np.random.default_rng(random_state)
+
+    logger.info(f"Surrogates of the {'task-related ' * is_task_related} HOI "
+                f"(min={minsize}; max={maxsize}; n_perm={n_perm}; "
+                f"surrogate={surrogate})")
+
+    # ______________________________ SURROGATES _______________________________
+    # batches of surrogates, given the resampled data (if any) and the
+    # covariance of one surrogate
+    c = prep.cov
+    n = c.shape[-1]
+    surr_nbytes = n_times * n ** 2 * c.dtype.itemsize
+    if not is_task_related:
+        surr_nbytes += prep.x.nbytes
+    n_surr = get_chunk_size(max_memory, surr_nbytes, n_perm)
+
+    # batches of multiplets evaluated for a batch of surrogates
+    tasks, sizes, offset = [], [], 0
+    for msize in range(minsize, maxsize + 1):
+        idx = CombinationIndex(
+            n_roi, msize, target=n_roi if is_task_related else None)
+        sizes += [(offset, idx)]
+        n_chunk = get_chunk_size(max_memory, n_surr * _oinfo_nbytes(
+            prep.x, msize + int(is_task_related), 'chol'), len(idx))
+        tasks += [(idx, k, min(k + n_chunk, len(idx)), offset + k)
+                  for k in range(0, len(idx), n_chunk)]
+        offset += len(idx)
+    n_mult = offset
+
+    # O-info of the data (n_times, n_mult)
+    oinfo = np.zeros((n_times, n_mult))
+    failed = np.zeros((n_times, n_mult), dtype=bool)
+    for idx, k, k_end, rank in tasks:
+        sl = slice(rank, rank + k_end - k)
+        oinfo[:, sl], failed[:, sl] = _oinfo_batch(
+            c, idx[k:k_end], None, 'chol', on_error, True)
+    score = _tail_score(oinfo, tail)
+
+    # failed O-info of the surrogates of each time point and multiplet
+    n_failed_surr = np.zeros((n_times,), dtype=int)
+    failed_surr = np.zeros((n_mult,), dtype=bool)
+
+    # number of surrogates with a score greater or equal to the data and
+    # maximum score of each surrogate
+    count = np.zeros((n_times, n_mult), dtype=int)
+    max_stat = np.full((n_perm,), -np.inf)
+    for s in range(0, n_perm, n_surr):
+        _n_surr = min(n_surr, n_perm - s)
+        logger.info(f"    Surrogates [{s}, {s + _n_surr}[")
+        index = _surrogate_index(
+            rng, _n_surr, 1 if is_task_related else n_roi,
+            n_times if surrogate == 'shift' else n_trials, surrogate)
+        c_s = _surrogate_cov(prep, index, surrogate).reshape(-1, n, n)
+        for idx, k, k_end, rank in tasks:
+            # scores of the batch of surrogates (n_times, n_surr, n_chunk)
+            _oinfo, _failed = _oinfo_batch(
+                c_s, idx[k:k_end], None, 'chol', on_error, True)
+            _score = _tail_score(_oinfo, tail).reshape(n_times, _n_surr, -1)
+            _failed = _failed.reshape(n_times, _n_surr, -1)
+            sl = slice(rank, rank + k_end - k)
+            n_failed_surr += _failed.sum((1, 2))
+            failed_surr[sl] |= _failed.any((0, 1))
+            count[:, sl] += (_score >= score[:, np.newaxis, sl]).sum(1)
+            max_stat[s:s + _n_surr] = np.maximum(
+                max_stat[s:s + _n_surr], _score.max((0, 2)))
+
+    # _______________________________ OUTPUTS _________________________________
+    pv = (count + 1.) / (n_perm + 1.)
+    max_stat = np.sort(max_stat)
+    pv_corr = (n_perm - np.searchsorted(max_stat, score, side='left') + 1.) / (
+        n_perm + 1.)
+    pv[np.isnan(oinfo)] = pv_corr[np.isnan(oinfo)] = np.nan
+    threshold = np.quantile(max_stat, 1. - alpha)
+
+    dims, coords = ('roi', 'times'), {'times': times}
+    coords.update(_multiplet_coords(
+        np.arange(n_mult), sizes, ('roi',), roi, 'str', is_task_related))
+    attrs.update(dict(
+        task_related=is_task_related, minsize=minsize, maxsize=maxsize,
+        n_perm=n_perm, surrogate=surrogate, tail=tail, alpha=alpha,
+        threshold=threshold
+    ))
+    if on_error != 'raise':
+        attrs.update(dict(
+            on_error=on_error,
+            n_failed=_report_failures(failed.sum(1), failed.any(0).sum(),
+                                      'O-info values', on_error),
+            n_failed_surrogates=_report_failures(
+                n_failed_surr, failed_surr.sum(), 'surrogate O-info',
+                on_error)
+        ))
+    stats = xr.Dataset(
+        {'oinfo': (dims, oinfo.T), 'pvalues': (dims, pv.T),
+         'pvalues_corr': (dims, pv_corr.T)},
+        coords=coords, attrs=check_attrs(attrs))
+
+    return stats
+
+
+def _bootstrap_batches(n_boot, n_trials, n_res, random_state=None):
+    """Iterate over batches of n_res bootstrap weights.
+
+    The weights are drawn batch after batch from the same generator, which
+    gives the same resamples as a single call to bootstrap_weights. When all
+    of the resamples fit in a single batch, their covariances are computed
+    beforehand and no weights are yielded.
+    """
+    if n_res == n_boot:
+        # the covariances of the resamples are already computed
+        yield 0, None
+        return
+    rng = np.random.default_rng(random_state)
+    p = np.full((n_trials,), 1. / n_trials)
+    for b in range(0, n_boot, n_res):
+        yield b, rng.multinomial(n_trials, p, size=min(n_res, n_boot - b))
+
+
+def conn_hoi_boot(data, y=None, times=None, roi=None, minsize=3, maxsize=5,
+                  n_boot=1000, ci=95, max_memory='10MB', on_error='raise',
+                  random_state=None, verbose=None):
+    """Bootstrap confidence intervals of the higher-order interactions.
+
+    The trials of the copnormed data are resampled with replacement, each
+    resample being described by multinomial trial weights. The covariances
+    of all of the resamples are then obtained from a single weighted product
+    over the trials (see :func:`itpg.entropy.cov_gauss_weighted_nd`), and
+    the O-info of the multiplets from them (see the 'chol' method of
+    :func:`conn_hoi`). The time points are processed in blocks so that the
+    covariances and O-info of all of the resamples fit in max_memory, the
+    percentiles being taken block after block. When a single time point
+    doesn't fit, the resamples are drawn and processed in batches instead.
+
+    Parameters
+    ----------
+    data : array_like
+        Electrophysiological data. Several input types are supported:
+
+            * Standard NumPy arrays of shape (n_epochs, n_roi, n_times)
+            * mne.Epochs
+            * xarray.DataArray of shape (n_epochs, n_roi, n_times)
+            * :class:`HOIData`, to reuse the copnormed data and covariance.
+              In that case, y, roi and times are taken from it.
+
+    y : array_like
+        The feature of shape (n_trials,) for estimating task-related O-info.
+    roi : array_like | None
+        Array of region of interest name of shape (n_roi,)
+    times : array_like | None
+        Array of time points of shape (n_times,)
+    minsize, maxsize : int | 3, 5
+        Minimum and maximum size of the multiplets
+    n_boot : int | 1000
+        Number of bootstrap resamples.
+    ci : float | 95
+        Level of the percentile confidence intervals, in percent.
+    max_memory : int | str | '10MB'
+        Memory budget used to evaluate the resamples and the multiplets in
+        batches. When the covariances of all of the resamples of a time
+        point don't fit in half of it, they are computed in batches of
+        resamples, again for each batch of multiplets (and only for their
+        regions), which is slower.
+    on_error : {'raise', 'nan', 'ridge', 'slogdet'}
+        What to do when a covariance is not positive definite (see
+        :func:`conn_hoi`). The numbers of O-info of the data and of the
+        resamples computed from such covariances are stored in the
+        'n_failed' and 'n_failed_boot' attributes.
+    random_state : int | None
+        Seed of the random generator of the resamples.
+
+    Returns
+    -------
+    stats : xarray.Dataset
+        Dataset of the multiplets (roi) and time points (times) with the
+        variables 'oinfo' (the O-info of the data), 'ci_low' and 'ci_high'
+        (the bounds of the confidence intervals).
+    """
+    # ________________________________ INPUTS _________________________________
+    prep = _get_hoi_data(data, y=y, times=times, roi=roi, verbose=verbose)
+    roi, times = prep.roi, prep.times
+    attrs, is_task_related = dict(prep.attrs), prep.is_task_related
+    n_times, n_roi, n_trials = prep.x.shape
+    maxsize = min(maxsize, n_roi) if isinstance(maxsize, int) else n_roi
+    assert 1 <= minsize <= maxsize
+    assert 0 < ci < 100, "ci should be a percentage"
+    assert n_boot >= 1
+
+    logger.info(f"Bootstrap of the {'task-related ' * is_task_related} HOI "
+                f"(min={minsize}; max={maxsize}; n_boot={n_boot})")
+
+    # _______________________________ RESAMPLES _______________________________
+    # half of the budget goes to the covariances of the resamples and half
+    # to the O-info of the multiplets. The data of one time point and its
+    # pairwise products are kept with the covariances, and the trial weights
+    # (counts and floats) of each resample with its covariance.
+    c = prep.cov
+    n = c.shape[-1]
+    if random_state is None:
+        # the resamples are drawn again for each batch of multiplets
+        random_state = np.random.SeedSequence().entropy
+    half = max(parse_memory(max_memory) // 2, 1)
+    data_nbytes = 2 * 8 * n * n_trials
+    cov_nbytes = 8 * n * (n + 1) + 16 * n_trials
+    n_res = get_chunk_size(max(half - data_nbytes, 1), cov_nbytes, n_boot)
+    if n_res == n_boot:
+        # the covariances of all of the resamples of a block of time points
+        # fit and are reused by all of the multiplets
+        n_blk = get_chunk_size(half, data_nbytes + n_boot * cov_nbytes,
+                               n_times)
+    else:
+        # otherwise, the covariances of batches of resamples are computed
+        # again for each batch of multiplets, one time point at a time
+        n_blk = 1
+
+    # batches of multiplets, given the O-info of all of the resamples (and
+    # the copy of the percentiles) and the factorizations of a batch of
+    # resamples
+    tasks, sizes, offset = [], [], 0
+    for msize in range(minsize, maxsize + 1):
+        idx = CombinationIndex(
+            n_roi, msize, target=n_roi if is_task_related else None)
+        sizes += [(offset, idx)]
+        n_chunk = get_chunk_size(half, n_blk * (16 * n_boot + n_res * (
+            _oinfo_nbytes(prep.x[:1], msize + int(is_task_related), 'chol'))),
+            len(idx))
+        tasks += [(idx, k, min(k + n_chunk, len(idx)), offset + k)
+                  for k in range(0, len(idx), n_chunk)]
+        offset += len(idx)
+    n_mult = offset
+
+    q = [(100. - ci) / 2., (100. + ci) / 2.]
+    oinfo = np.zeros((n_times, n_mult))
+    bounds = np.zeros((2, n_times, n_mult))
+    # failed O-info of the data and of the resamples
+    failed = np.zeros((n_times, n_mult), dtype=bool)
+    n_failed_boot = np.zeros((n_times,), dtype=int)
+    failed_boot = np.zeros((n_mult,), dtype=bool)
+    for t in range(0, n_times, n_blk):
+        ts = slice(t, t + n_blk)
+        logger.info(f"    Time points [{t}, {min(t + n_blk, n_times)}[")
+        x_t = _hoi_data(prep.x[ts], prep.y)
+        _n_blk = len(x_t)
+        if n_res == n_boot:
+            # covariances of the resamples (n_blk, n_boot, n, n)
+            c_t = cov_gauss_weighted_nd(x_t, bootstrap_weights(
+                n_boot, n_trials, random_state=random_state))
+        for idx, k, k_end, rank in tasks:
+            mult, sl = idx[k:k_end], slice(rank, rank + k_end - k)
+            oinfo[ts, sl], failed[ts, sl] = _oinfo_batch(
+                c[ts], mult, None, 'chol', on_error, True)
+            if n_res < n_boot:
+                # only the variables of the multiplets
+                var, mult = np.unique(mult, return_inverse=True)
+                mult = mult.reshape(k_end - k, -1)
+            _oinfo = np.empty((_n_blk, n_boot, k_end - k))
+            for b, w in _bootstrap_batches(n_boot, n_trials, n_res,
+                                           random_state):
+                if n_res == n_boot:
+                    c_b = c_t
+                else:
+                    c_b = cov_gauss_weighted_nd(x_t[:, var], w)
+                _o, _failed = _oinfo_batch(
+                    c_b.reshape((-1,) + c_b.shape[-2:]), mult, None, 'chol',
+                    on_error, True)
+                _oinfo[:, b:b + n_res] = _o.reshape(_n_blk, -1, k_end - k)
+                _failed = _failed.reshape(_n_blk, -1, k_end - k)
+                n_failed_boot[ts] += _failed.sum((1, 2))
+                failed_boot[sl] |= _failed.any((0, 1))
+                # release the batch before computing the next one
+                del c_b, w
+            bounds[:, ts, sl] = np.percentile(_oinfo, q, axis=1)
+
+    # _______________________________ OUTPUTS _________________________________
+    dims, coords = ('roi', 'times'), {'times': times}
+    coords.update(_multiplet_coords(
+        np.arange(n_mult), sizes, ('roi',), roi, 'str', is_task_related))
+    attrs.update(dict(
+        task_related=is_task_related, minsize=minsize, maxsize=maxsize,
+        n_boot=n_boot, ci=ci
+    ))
+    if on_error != 'raise':
+        attrs.update(dict(
+            on_error=on_error,
+            n_failed=_report_failures(failed.sum(1), failed.any(0).sum(),
+                                      'O-info values', on_error),
+            n_failed_boot=_report_failures(
+                n_failed_boot, failed_boot.sum(), 'resampled O-info',
+                on_error)
+        ))
+    stats = xr.Dataset(
+        {'oinfo': (dims, oinfo.T), 'ci_low': (dims, bounds[0].T),
+         'ci_high': (dims, bounds[1].T)},
+        coords=coords, attrs=check_attrs(attrs))
+
+    return stats
@@ -4,10 +4,14 @@
 # Date: 01/2023
 
 import numpy as np
-from ..entropy.entropy_gaussian import entropy_gauss_nd, entropy_gauss
 
+from ..backend import get_kernel
+from ..entropy.entropy_gaussian import (entropy_gauss_nd, entropy_gauss,
+                                        entropy_gauss_cov_nd, cov_gauss_sub_nd,
+                                        _bisect_failures, ON_ERROR)
 
-def compute_oinfo(x, ind):
+
+def compute_oinfo(x, ind, on_error='raise', dtype=None, return_failed=False):
     """Compute the O-info.
 
     Parameters
@@ -16,18 +20,144 @@ def compute_oinfo(x, ind):
         Multidimensional data array.
     ind : list
         Indices for tensor computations.
+    on_error : {'raise', 'nan', 'ridge', 'slogdet'}
+        Strategy for the covariances that are not positive definite (see
+        itpg.entropy.logdet_nd).
+    dtype : np.dtype | None
+        Use np.float32 to store and multiply the data in single precision
+        (see itpg.entropy.entropy_gauss_nd).
+    return_failed : bool
+        If True, also return the boolean array of the multiplets whose
+        covariance is not positive definite. Their leave-one-out
+        covariances can only fail with them.
 
     Returns
     -------
     float
         O-Information.
     """
+    if dtype is not None:
+        x = x.astype(dtype, copy=False)
     nvars = x.shape[-2]
-    o = (nvars - 2) * entropy_gauss_nd(x)
-    o += (entropy_gauss_nd(x[..., np.newaxis, :])
-          - entropy_gauss_nd(x[..., ind, :])).sum(-1)
+    h, failed = entropy_gauss_nd(x, on_error=on_error, return_failed=True)
+    o = (nvars - 2) * h
+    o += (entropy_gauss_nd(x[..., np.newaxis, :], on_error=on_error)
+          - entropy_gauss_nd(x[..., ind, :], on_error=on_error)).sum(-1)
 
-    return o
+    return (o, failed) if return_failed else o
+
+
+def compute_oinfo_cov(c, ind, on_error='raise', return_failed=False):
+    """Compute the O-info from a covariance matrix.
+
+    The entropies are computed from the sub-blocks of the covariance, so the
+    trials are never touched. Passing the sub-block of a full covariance is
+    equivalent to computing the O-info on the data of the multiplet.
+
+    Parameters
+    ----------
+    c : ndarray, shape (..., n_vars, n_vars)
+        Covariance of the multiplet.
+    ind : list
+        Indices for tensor computations.
+    on_error : {'raise', 'nan', 'ridge', 'slogdet'}
+        Strategy for the covariances that are not positive definite (see
+        itpg.entropy.logdet_nd).
+    return_failed : bool
+        If True, also return the boolean array of the multiplets whose
+        covariance is not positive definite. Their leave-one-out
+        covariances can only fail with them.
+
+    Returns
+    -------
+    float
+        O-Information.
+    """
+    nvars = c.shape[-1]
+    # single variable covariances are the diagonal
+    c_diag = np.einsum('...ii->...i', c)[..., np.newaxis, np.newaxis]
+    # leave-one-out covariances of shape (..., n_vars, n_vars-1, n_vars-1)
+    c_ind = cov_gauss_sub_nd(c, ind)
+
+    h, failed = entropy_gauss_cov_nd(c, on_error=on_error,
+                                     return_failed=True)
+    o = (nvars - 2) * h
+    o += (entropy_gauss_cov_nd(c_diag, on_error=on_error)
+          - entropy_gauss_cov_nd(c_ind, on_error=on_error)).sum(-1)
+
+    return (o, failed) if return_failed else o
+
+
+def _oinfo_chol(c):
+    """O-info of covariances (..., n_vars, n_vars) from their cholesky."""
+    chc = np.linalg.cholesky(c)
+    # log|c| = 2 * sum(log(diag(chc)))
+    logdet = 2. * np.log(np.einsum('...ii->...i', chc)).sum(-1, dtype=float)
+    # inv(c) = inv(chc).T @ inv(chc) so inv(c)_jj = sum_i(inv(chc)_ij^2)
+    chc_inv = np.linalg.inv(chc)
+    prec_diag = (chc_inv ** 2).sum(-2)
+    c_diag = np.einsum('...ii->...i', c)
+
+    return 0.5 * (np.log(c_diag) - np.log(prec_diag)).sum(
+        -1, dtype=float) - logdet
+
+
+def compute_oinfo_chol(c, on_error='raise', return_failed=False):
+    """Compute the O-info from a single cholesky factorization.
+
+    The covariance of each leave-one-out subset is never factorized. Its
+    determinant is derived from the full one using the Schur complement
+    |c_{-j}| = |c| * inv(c)_{jj}, where the diagonal of the precision matrix
+    is obtained from the inverse of the cholesky factor. With
+    H(X^n) = 0.5 * log|c| + cst, the O-info becomes :
+
+        O = 0.5 * sum_j(log(c_jj) - log(inv(c)_jj)) - log|c|
+
+    Parameters
+    ----------
+    c : ndarray, shape (..., n_vars, n_vars)
+        Covariance of the multiplet.
+    on_error : {'raise', 'nan', 'ridge', 'slogdet'}
+        Strategy for the covariances that are not positive definite (see
+        itpg.entropy.logdet_nd). The failed covariances are located by
+        bisection and only them are computed again with compute_oinfo_cov.
+        With a jax or numba backend (see itpg.set_backend), a compiled
+        kernel is used instead.
+    return_failed : bool
+        If True, also return the boolean array of the multiplets whose
+        covariance is not positive definite. Their leave-one-out
+        covariances can only fail with them.
+
+    Returns
+    -------
+    float
+        O-Information.
+    """
+    assert on_error in ON_ERROR, f"on_error should be in {ON_ERROR}"
+    nvars, shape = c.shape[-1], c.shape[:-2]
+    kernel = get_kernel('oinfo_chol')
+    if kernel is None:
+        try:
+            o, failed = _oinfo_chol(c), np.zeros(shape, dtype=bool)
+            return (o, failed[()]) if return_failed else o
+        except np.linalg.LinAlgError:
+            if on_error == 'raise':
+                raise
+        o, failed = _bisect_failures(_oinfo_chol, c.reshape(-1, nvars, nvars))
+    else:
+        # compiled kernel of the backend, NaN for the failed covariances
+        o = np.array(kernel(c), dtype=float).ravel()
+        failed = np.isnan(o)
+        if failed.any() and (on_error == 'raise'):
+            raise np.linalg.LinAlgError("Matrix is not positive definite")
+
+    if failed.any():
+        ind = (np.mgrid[0:nvars, 0:nvars].sum(0) % nvars)[:, 1:]
+        c = c.reshape(-1, nvars, nvars)
+        o[failed] = compute_oinfo_cov(c[failed], ind, on_error=on_error)
+
+    o, failed = o.reshape(shape)[()], failed.reshape(shape)[()]
+    return (o, failed) if return_failed else o
 
 
 def compute_oinfo_loop(x):
@@ -0,0 +1,210 @@
+"""Preprocessed data reusable across higher order interactions calls."""
+# Authors: Christian Ferreyra, chrisferreyra13@gmail.com
+# Date: 2023
+# License: MIT License
+
+import numpy as np
+
+from frites.conn import conn_io
+from frites.io import logger
+from frites.core import copnorm_nd
+
+from ..entropy.entropy_gaussian import cov_gauss_nd, cov_gauss_cross_nd
+
+
+def _hoi_inputs(data, y=None, times=None, roi=None, dtype=np.float64,
+                verbose=None):
+    """Prepare the data for the higher-order interactions.
+
+    The data are returned copnormed and demeaned with a shape of (n_times,
+    n_roi, n_trials) and the given dtype. For task-related HOI, the
+    behaviour is copnormed once and returned as a vector of shape
+    (n_trials,), 'beh' being added as a last region name.
+    """
+    # inputs conversion
+    is_task_related = isinstance(y, (str, list, np.ndarray, tuple))
+    kw_links = {'directed': False, 'net': False}
+    data, cfg = conn_io(
+        data, y=y, times=times, roi=roi, name='DynOinfo', verbose=verbose,
+        kw_links=kw_links
+    )
+
+    # extract variables
+    x, attrs = data.data, cfg['attrs']
+    y, roi, times = data['y'].data, data['roi'].data, data['times'].data
+
+    logger.info("    Copnorm the data")
+
+    # copnorm and demean the data
+    x = copnorm_nd(x.copy(), axis=0)
+    x = (x - x.mean(axis=0, keepdims=True))
+
+    # make the data (n_times, n_roi, n_trials)
+    x = x.transpose(2, 1, 0).astype(dtype, copy=False)
+
+    # the behaviour is the same at every time point
+    if is_task_related:
+        y = copnorm_nd(y.astype(float), axis=0)
+        y = (y - y.mean()).astype(dtype, copy=False)
+        roi = np.r_[roi, ['beh']]
+    else:
+        y = None
+
+    return x, y, roi, times, attrs, is_task_related
+
+
+def _hoi_data(x, y):
+    """Data with the behaviour as a last region (n_times, n_roi, n_trials)."""
+    if y is None:
+        return x
+    y = np.broadcast_to(y, (x.shape[0], 1, x.shape[2]))
+    return np.concatenate((x, y), axis=1)
+
+
+def _hoi_cov(x, y):
+    """Covariance of the regions and the behaviour (n_times, n_roi, n_roi).
+
+    The cross-covariances of the behaviour with all of the regions and time
+    points are computed with a single product, without copying the
+    behaviour for each time point.
+    """
+    c_xx = cov_gauss_nd(x)
+    if y is None:
+        return c_xx
+    n_times, n_roi, n_trials = x.shape
+    c = np.empty((n_times, n_roi + 1, n_roi + 1), dtype=c_xx.dtype)
+    c[:, :n_roi, :n_roi] = c_xx
+    c[:, :n_roi, -1] = c[:, -1, :n_roi] = cov_gauss_cross_nd(x, y)
+    c[:, -1, -1] = (y.astype(float) @ y) / (n_trials - 1.)
+    return c
+
+
+class HOIData(object):
+    """Copnormed data that can be reused by several HOI estimations.
+
+    The conversion, copnorm (a rank transform over trials) and demeaning of
+    the data are done once, and the covariance of the regions is computed
+    the first time it is needed and then kept. An HOIData can be given to
+    :func:`conn_hoi` and :func:`conn_hoi_beam` instead of the data, e.g. to
+    run them with different minsize / maxsize, with and without the
+    behaviour or on subsets of regions.
+
+    Parameters
+    ----------
+    data : array_like
+        Electrophysiological data. Several input types are supported:
+
+            * Standard NumPy arrays of shape (n_epochs, n_roi, n_times)
+            * mne.Epochs
+            * xarray.DataArray of shape (n_epochs, n_roi, n_times)
+
+    y : array_like
+        The feature of shape (n_trials,) for estimating task-related O-info.
+    roi : array_like | None
+        Array of region of interest name of shape (n_roi,)
+    times : array_like | None
+        Array of time points of shape (n_times,)
+    dtype : {'float64', 'float32'}
+        Precision used to store the copnormed data and the covariance.
+
+    Attributes
+    ----------
+    x : array_like
+        Copnormed and demeaned data of shape (n_times, n_roi, n_trials)
+    y : array_like | None
+        Copnormed and demeaned behaviour of shape (n_trials,)
+    roi : array_like
+        Names of the regions, with a last 'beh' region for task-related HOI
+    """
+
+    def __init__(self, data, y=None, times=None, roi=None, dtype='float64',
+                 verbose=None):
+        assert dtype in ['float64', 'float32'], (
+            "dtype should be 'float64' or 'float32'")
+        self.x, self.y, self.roi, self.times, self.attrs, \
+            self.is_task_related = _hoi_inputs(
+                data, y=y, times=times, roi=roi, dtype=dtype,
+                verbose=verbose)
+        self.dtype = dtype
+        self._cov = None
+
+    def __repr__(self):
+        n_times, n_roi, n_trials = self.x.shape
+        return (f"HOIData(n_trials={n_trials}, n_roi={n_roi}, "
+                f"n_times={n_times}, task_related={self.is_task_related}, "
+                f"dtype={self.dtype})")
+
+    @property
+    def cov(self):
+        """Covariance of shape (n_times, n_roi, n_roi), including 'beh'."""
+        if self._cov is None:
+            logger.info("    Compute the covariance")
+            self._cov = _hoi_cov(self.x, self.y)
+        return self._cov
+
+    @property
+    def data(self):
+        """Data of shape (n_times, n_roi, n_trials), including 'beh'."""
+        return _hoi_data(self.x, self.y)
+
+    def subset(self, roi=None, task_related=True):
+        """Get the preprocessed data of a subset of regions.
+
+        The subset is not preprocessed again. When the regions are
+        contiguous (e.g. roi=None), the data and the covariance, if it was
+        already computed, are views of the ones of the whole set. Otherwise,
+        the selected regions are copied.
+
+        Parameters
+        ----------
+        roi : array_like | None
+            Names of the regions to keep. If None, all of the regions are
+            kept.
+        task_related : bool
+            If False, the behaviour is dropped.
+
+        Returns
+        -------
+        HOIData
+            Preprocessed data of the subset.
+        """
+        n_roi = len(self.roi) - int(self.is_task_related)
+        names = list(self.roi[:n_roi])
+        idx = np.arange(n_roi) if roi is None else np.array(
+            [names.index(r) for r in roi], dtype=int)
+        keep_y = self.is_task_related and task_related
+        c_idx = np.r_[idx, [n_roi] * int(keep_y)].astype(int)
+
+        sub = HOIData.__new__(HOIData)
+        sub.x, sub.y = self.x[:, _as_slice(idx), :], self.y if keep_y else None
+        sub.roi = np.r_[self.roi[idx], ['beh'] * int(keep_y)]
+        sub.times, sub.attrs = self.times, dict(self.attrs)
+        sub.is_task_related, sub.dtype, sub._cov = keep_y, self.dtype, None
+        if self._cov is not None:
+            c_sl = _as_slice(c_idx)
+            if isinstance(c_sl, slice):
+                sub._cov = self._cov[:, c_sl, c_sl]
+            else:
+                sub._cov = self._cov[:, c_idx[:, np.newaxis], c_idx]
+        return sub
+
+
+def _as_slice(idx):
+    """Slice of contiguous indices, so that indexing gives a view."""
+    if len(idx) and (np.diff(idx) == 1).all():
+        return slice(int(idx[0]), int(idx[-1]) + 1)
+    return idx
+
+
+def _get_hoi_data(data, y=None, times=None, roi=None, dtype=None,
+                  verbose=None):
+    """Preprocess the data, unless they already are."""
+    if isinstance(data, HOIData):
+        assert (y is None) and (times is None) and (roi is None), (
+            "y, times and roi should be given to HOIData")
+        assert dtype in [None, data.dtype], (
+            f"the data were prepared with dtype='{data.dtype}'")
+        return data
+    return HOIData(data, y=y, times=times, roi=roi,
+                   dtype='float64' if dtype is None else dtype,
+                   verbose=verbose)
@@ -0,0 +1,73 @@
+"""Tests for the entropy cache."""
+# Authors: Christian Ferreyra, chrisferreyra13@gmail.com
+# Date: 2023
+# License: MIT License
+
+
+import numpy as np
+import pytest
+
+from ..cache import EntropyCache
+
+
+def test_entropy_cache():
+    """Test hits, misses and evictions of the entropy cache."""
+    cache = EntropyCache(max_entries=2)
+    cache.set([(0, 1), (2, 1)], np.array([[1., 1.], [2., 2.]]))
+    assert (1, 2) in cache
+
+    h, found = cache.get([(1, 0), (0, 2)])
+    np.testing.assert_array_equal(found, [True, False])
+    np.testing.assert_array_equal(h, [[1., 1.]])
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # (1, 2) is the least recently used entropy
+    cache.set([(0, 2)], np.array([[3., 3.]]))
+    assert (1, 2) not in cache
+    assert (0, 1) in cache
+    assert (len(cache), cache.evictions) == (2, 1)
+
+    # subsets of several sizes
+    cache.set([(4,), (5,)], np.array([[4., 4.], [5., 5.]]))
+    assert (len(cache), cache.evictions) == (2, 3)
+    h, found = cache.get([(5,), (3,)])
+    np.testing.assert_array_equal(found, [True, False])
+    np.testing.assert_array_equal(h, [[5., 5.]])
+    assert (0, 1) not in cache
+
+    with pytest.raises(ValueError, match="max_entries"):
+        EntropyCache(max_entries=0)
+
+
+def test_entropy_cache_ranks():
+    """Test that the ranks identify the subsets of the same size."""
+    rng = np.random.default_rng(0)
+    cache = EntropyCache()
+    for k in [1, 3, 4]:
+        sub = np.array([rng.permutation(12)[:k] for _ in range(200)])
+        ranks = cache.ranks(sub)
+        keys = np.unique(np.sort(sub, axis=-1), axis=0)
+        assert len(np.unique(ranks)) == len(keys)
+
+        # unbounded cache of all of the subsets
+        cache.set(sub, np.c_[ranks, ranks])
+        h, found = cache.get(sub[::-1])
+        assert found.all()
+        np.testing.assert_array_equal(h[:, 0], ranks[::-1])
+
+
+def test_entropy_cache_memory():
+    """Test that the index grows with the number of cached entropies."""
+    rng = np.random.default_rng(0)
+    cache = EntropyCache(max_entries=10)
+    # subsets with ranks up to C(100, 10) ~ 1.7e13
+    sub = np.sort([rng.permutation(100)[:10] for _ in range(20)], axis=-1)
+    cache.set(sub, np.ones((20, 2)))
+    cache.set([np.arange(95, 100)], np.ones((1, 2)))
+    assert (len(cache), cache.evictions) == (10, 11)
+    assert tuple(range(95, 100)) in cache
+    assert tuple(sub[np.argmax(cache.ranks(sub))]) in cache
+
+    # the index only holds the cached ranks
+    assert sum(len(r) for r, _ in cache._index.values()) == len(cache)
+    assert cache._values.nbytes <= 10 * 2 * 8
@@ -0,0 +1,277 @@
+"""Tests for higher order interactions connectivity."""
+# Authors: Christian Ferreyra, chrisferreyra13@gmail.com
+# Date: 2023
+# License: MIT License
+
+
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+import xarray as xr
+
+from ...entropy.entropy_gaussian import cov_gauss_nd
+from ..conn_oinfo import conn_hoi, merge_hoi_shards
+from ..prepared import HOIData, _hoi_inputs, _hoi_cov, _hoi_data
+from ..utils import (get_multiplet_labels, get_multiplet_members,
+                     select_multiplets)
+
+
+def _get_data(n_trials=100, n_roi=5, n_times=10, seed=0):
+    """Random data of shape (n_trials, n_roi, n_times)."""
+    rng = np.random.default_rng(seed)
+    x = rng.standard_normal((n_trials, n_roi, n_times))
+    x[:, 2, :] += x[:, 0, :] + x[:, 1, :]
+    roi = np.array([f"r{r}" for r in range(n_roi)])
+    times = np.arange(n_times)
+    y = rng.standard_normal(n_trials)
+    return x, y, times, roi
+
+
+def test_conn_hoi_methods():
+    """Test that the covariance and data methods give the same O-info."""
+    x, y, times, roi = _get_data()
+
+    kw = dict(times=times, roi=roi, minsize=3, maxsize=4)
+    o_data = conn_hoi(x, method='data', **kw)
+    o_cov = conn_hoi(x, method='cov', **kw)
+    o_chol = conn_hoi(x, method='chol', **kw)
+    assert o_cov.shape == (15, len(times))
+    np.testing.assert_array_equal(o_cov['roi'].data, o_data['roi'].data)
+    np.testing.assert_array_almost_equal(o_cov.data, o_data.data)
+    np.testing.assert_array_almost_equal(o_chol.data, o_data.data)
+
+    # task-related
+    kw = dict(y=y, times=times, roi=roi, minsize=2, maxsize=3)
+    o_data = conn_hoi(x, method='data', **kw)
+    o_cov = conn_hoi(x, method='cov', **kw)
+    o_chol = conn_hoi(x, method='chol', **kw)
+    np.testing.assert_array_almost_equal(o_cov.data, o_data.data)
+    np.testing.assert_array_almost_equal(o_chol.data, o_data.data)
+
+
+def test_conn_hoi_max_memory():
+    """Test that batching the multiplets doesn't change the O-info."""
+    x, y, times, roi = _get_data()
+
+    kw = dict(times=times, roi=roi, minsize=3, maxsize=5)
+    for method in ['cov', 'chol', 'data']:
+        o_ref = conn_hoi(x, method=method, **kw)
+        # a single multiplet per batch
+        o_single = conn_hoi(x, method=method, max_memory=1, **kw)
+        # a few multiplets per batch
+        o_chunk = conn_hoi(x, method=method, max_memory='20KB', **kw)
+        np.testing.assert_array_almost_equal(o_single.data, o_ref.data)
+        np.testing.assert_array_almost_equal(o_chunk.data, o_ref.data)
+
+
+def test_conn_hoi_cache():
+    """Test that caching the subset entropies doesn't change the O-info."""
+    x, y, times, roi = _get_data()
+
+    kw = dict(times=times, roi=roi, minsize=3, maxsize=5)
+    for method in ['cov', 'data']:
+        o_ref = conn_hoi(x, method=method, **kw)
+        o_cache = conn_hoi(x, method=method, cache=True, **kw)
+        np.testing.assert_array_almost_equal(o_cache.data, o_ref.data)
+        # bounded cache with evictions
+        o_cache = conn_hoi(x, method=method, cache=4, max_memory=1, **kw)
+        np.testing.assert_array_almost_equal(o_cache.data, o_ref.data)
+
+    # task-related
+    kw = dict(y=y, times=times, roi=roi, minsize=2, maxsize=4)
+    o_ref = conn_hoi(x, **kw)
+    o_cache = conn_hoi(x, cache=True, **kw)
+    np.testing.assert_array_almost_equal(o_cache.data, o_ref.data)
+
+    # invalid sizes of the cache
+    for cache in [0, -1, 'yes']:
+        with pytest.raises(ValueError, match="cache should be"):
+            conn_hoi(x, cache=cache, **kw)
+
+
+def test_conn_hoi_n_jobs():
+    """Test that the parallel O-info is the same as the sequential one."""
+    x, y, times, roi = _get_data()
+
+    kw = dict(times=times, roi=roi, minsize=3, maxsize=5)
+    for method in ['cov', 'data']:
+        o_ref = conn_hoi(x, method=method, **kw)
+        o_para = conn_hoi(x, method=method, n_jobs=2, **kw)
+        np.testing.assert_array_equal(o_para['roi'].data, o_ref['roi'].data)
+        np.testing.assert_array_almost_equal(o_para.data, o_ref.data)
+
+
+def test_conn_hoi_shards(tmp_path):
+    """Test that merged shards computed in separate processes are the same
+    as a single run."""
+    x, y, times, roi = _get_data()
+    np.save(tmp_path / 'x.npy', x)
+
+    kw = dict(times=times, roi=roi, minsize=2, maxsize=4)
+    o_ref = conn_hoi(x, **kw)
+
+    # run each shard in its own process
+    n_shards = 4
+    script = (
+        "import sys, numpy as np\n"
+        "from itpg.connectivity import conn_hoi\n"
+        "i, n, path = int(sys.argv[1]), int(sys.argv[2]), sys.argv[3]\n"
+        "x = np.load(path + '/x.npy')\n"
+        "roi = np.array([f'r{r}' for r in range(x.shape[1])])\n"
+        "o = conn_hoi(x, times=np.arange(x.shape[-1]), roi=roi, minsize=2,\n"
+        "             maxsize=4, shard=(i, n))\n"
+        "o.to_netcdf(f'{path}/shard_{i}.nc')\n"
+    )
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    for i in range(n_shards):
+        subprocess.run([sys.executable, '-c', script, str(i), str(n_shards),
+                        str(tmp_path)], check=True, env=env)
+
+    paths = [tmp_path / f'shard_{i}.nc' for i in range(n_shards)][::-1]
+    o_merged = merge_hoi_shards(paths)
+    xr.testing.assert_identical(o_merged, o_ref)
+
+    # missing shard
+    with pytest.raises(ValueError):
+        merge_hoi_shards(paths[1:])
+
+
+def test_conn_hoi_shards_sparse():
+    """Test the merge of the shards of the top_k and thresholded O-info."""
+    x, y, times, roi = _get_data()
+    kw = dict(times=times, roi=roi, minsize=3, maxsize=4)
+    for sparse in [dict(top_k=6), dict(top_k=6, tail='both'),
+                   dict(top_k=6, roi_coords='int'), dict(threshold=.1)]:
+        o_ref = conn_hoi(x, **kw, **sparse)
+        shards = [conn_hoi(x, shard=(i, 4), **kw, **sparse)
+                  for i in range(4)]
+        xr.testing.assert_identical(merge_hoi_shards(shards), o_ref)
+
+
+def test_conn_hoi_roi_coords():
+    """Test the integer coordinates of the multiplets."""
+    x, y, times, roi = _get_data()
+
+    for _y, minsize in zip([None, y], [3, 2]):
+        kw = dict(y=_y, times=times, roi=roi, minsize=minsize, maxsize=4)
+        o_str = conn_hoi(x, roi_coords='str', **kw)
+        o_int = conn_hoi(x, roi_coords='int', **kw)
+        np.testing.assert_array_equal(o_int.data, o_str.data)
+        np.testing.assert_array_equal(o_int['roi'], np.arange(len(o_str)))
+        assert get_multiplet_labels(o_int) == o_str['roi'].data.tolist()
+
+    # task-related multiplets of mixed sizes, the behaviour being last
+    labels = o_str['roi'].data
+    np.testing.assert_array_equal(
+        o_int['msize'], [len(r.split('-')) - 1 for r in labels])
+    members = get_multiplet_members(o_int)
+    assert members.shape == (len(labels), 5)
+    assert (members[:, -1] == 5).all()
+    is_2 = o_int['msize'].data == 2
+    assert (members[is_2, 2:4] == -1).all()
+    assert (members[~is_2, :3] >= 0).all()
+    assert len(select_multiplets(o_int, 'beh')) == len(labels)
+
+    # all the multiplets containing r1 and r3
+    o_sel = select_multiplets(o_int, ['r1', 'r3'])
+    is_sel = [('r1' in r) and ('r3' in r) for r in o_str['roi'].data]
+    np.testing.assert_array_equal(o_sel.data, o_str.data[is_sel])
+
+
+def test_conn_hoi_sparse():
+    """Test the top-k and thresholded O-info."""
+    x, y, times, roi = _get_data()
+
+    kw = dict(times=times, roi=roi, minsize=3, maxsize=5, max_memory=1)
+    o_ref = conn_hoi(x, **kw)
+    labels = o_ref['roi'].data
+
+    # top-k of the absolute O-info
+    o_top = conn_hoi(x, top_k=4, **kw)
+    assert o_top.dims == ('top', 'times')
+    order = np.argsort(-np.abs(o_ref.data), axis=0, kind='stable')[:4]
+    np.testing.assert_array_almost_equal(
+        o_top.data, np.take_along_axis(o_ref.data, order, 0))
+    np.testing.assert_array_equal(o_top['roi'].data, labels[order])
+
+    # both tails with integer coordinates
+    o_top = conn_hoi(x, top_k=3, tail='both', roi_coords='int', **kw)
+    assert o_top.shape == (2, 3, len(times))
+    np.testing.assert_array_almost_equal(
+        o_top.sel(tail='redundancy').data, -np.sort(-o_ref.data, 0)[:3])
+    np.testing.assert_array_almost_equal(
+        o_top.sel(tail='synergy').data, np.sort(o_ref.data, 0)[:3])
+    ranks = o_top.sel(tail='synergy')['roi'].data
+    np.testing.assert_array_almost_equal(
+        np.take_along_axis(o_ref.data, ranks, 0), np.sort(o_ref.data, 0)[:3])
+
+    # threshold
+    thr = np.percentile(np.abs(o_ref.data), 90)
+    o_thr = conn_hoi(x, threshold=thr, **kw)
+    is_sup = np.abs(o_ref.data) >= thr
+    assert o_thr.dims == ('nnz',)
+    assert len(o_thr) == is_sup.sum()
+    dense = o_ref.where(is_sup).to_series().dropna().sort_index()
+    sparse = o_thr.to_series().set_axis(
+        list(zip(o_thr['roi'].data, o_thr['times'].data))).sort_index()
+    np.testing.assert_array_almost_equal(sparse.values, dense.values)
+    assert sparse.index.tolist() == dense.index.tolist()
+
+
+def test_conn_hoi_on_error():
+    """Test that the on_error strategies don't change healthy results."""
+    x, y, times, roi = _get_data()
+
+    kw = dict(times=times, roi=roi, minsize=3, maxsize=4)
+    o_true = conn_hoi(x, **kw)
+    for method in ['cov', 'chol', 'data']:
+        o = conn_hoi(x, method=method, on_error='nan', **kw)
+        np.testing.assert_array_almost_equal(o.data, o_true.data)
+        assert o.attrs['on_error'] == 'nan'
+        assert o.attrs['n_failed'] == 0
+
+    # null variance of r1 at two time points, where the 6 multiplets of size
+    # 3 and the 4 of size 4 with r1 fail, whatever the batches
+    prep = HOIData(x, times=times, roi=roi)
+    prep.x[[3, 7], 1, :] = 0.
+    kw = dict(minsize=3, maxsize=4, on_error='nan')
+    for method in ['cov', 'chol', 'data']:
+        for kw_run in [dict(), dict(max_memory=1), dict(cache=True)]:
+            o = conn_hoi(prep, method=method, **kw, **kw_run)
+            assert o.attrs['n_failed'] == 2 * (6 + 4)
+            assert np.isnan(o.data).sum() == 2 * (6 + 4)
+
+    # the failures of the shards are summed
+    shards = [conn_hoi(prep, shard=(i, 3), **kw) for i in range(3)]
+    assert merge_hoi_shards(shards).attrs['n_failed'] == 2 * (6 + 4)
+
+
+def test_conn_hoi_float32():
+    """Test the error of the single precision O-info."""
+    x, y, times, roi = _get_data()
+
+    for method in ['cov', 'chol']:
+        kw = dict(times=times, roi=roi, minsize=3, maxsize=5, method=method)
+        o_64 = conn_hoi(x, **kw)
+        o_32 = conn_hoi(x, dtype='float32', **kw)
+        assert o_32.attrs['dtype'] == 'float32'
+        np.testing.assert_allclose(o_32.data, o_64.data, rtol=0, atol=1e-5)
+
+        o_64 = conn_hoi(x, y=y, **kw)
+        o_32 = conn_hoi(x, y=y, dtype='float32', **kw)
+        np.testing.assert_allclose(o_32.data, o_64.data, rtol=0, atol=1e-5)
+
+
+def test_hoi_cov_task_related():
+    """Test the covariance of the regions with the behaviour."""
+    x, y, times, roi = _get_data(n_trials=600)
+
+    x, y, roi, _, _, _ = _hoi_inputs(x, y=y, times=times, roi=roi)
+    assert y.shape == (600,) and roi[-1] == 'beh'
+    c_true = cov_gauss_nd(_hoi_data(x, y))
+    np.testing.assert_array_almost_equal(_hoi_cov(x, y), c_true)
+    np.testing.assert_array_almost_equal(
+        _hoi_cov(x.astype(np.float32), y.astype(np.float32)), c_true)
@@ -0,0 +1,40 @@
+"""Tests for the beam search of higher order interactions."""
+# Authors: Christian Ferreyra, chrisferreyra13@gmail.com
+# Date: 2023
+# License: MIT License
+
+
+import numpy as np
+
+from ..conn_oinfo import conn_hoi
+from ..hoi_search import conn_hoi_beam
+from .test_conn_oinfo import _get_data
+
+
+def test_conn_hoi_beam():
+    """Test the beam search against the exhaustive O-info."""
+    x, y, times, roi = _get_data(n_roi=6)
+
+    for _y, criterion, minsize in zip([None, y], ['synergy', 'redundancy'],
+                                      [3, 2]):
+        kw = dict(y=_y, times=times, roi=roi, minsize=minsize, maxsize=5)
+        o_ref = conn_hoi(x, **kw).to_pandas().mean(1)
+        if criterion == 'synergy':
+            o_ref = -o_ref
+
+        # a beam that keeps all the multiplets is exhaustive
+        o_beam = conn_hoi_beam(x, beam_width=100, criterion=criterion, **kw)
+        assert len(o_beam) == len(o_ref)
+        np.testing.assert_array_almost_equal(
+            o_beam['score'].data, o_ref[o_beam['roi'].data].values)
+
+        # greedy search
+        o_greedy = conn_hoi_beam(x, beam_width=1, criterion=criterion, **kw)
+        np.testing.assert_array_equal(o_greedy['msize'],
+                                      np.arange(minsize, 6))
+        best = o_ref[[len(r.split('-')) == minsize + (_y is not None)
+                      for r in o_ref.index]].idxmax()
+        assert o_greedy['roi'].data[0] == best
+        for r_prev, r_next in zip(o_greedy['roi'].data[:-1],
+                                  o_greedy['roi'].data[1:]):
+            assert set(r_prev.split('-')) < set(r_next.split('-'))
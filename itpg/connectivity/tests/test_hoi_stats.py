@@ -0,0 +1,164 @@
+"""Tests for the surrogate testing of higher order interactions."""
+# Authors: Christian Ferreyra, chrisferreyra13@gmail.com
+# Date: 2023
+# License: MIT License
+
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from ...entropy.entropy_gaussian import bootstrap_weights, cov_gauss_nd
+from ..conn_oinfo import conn_hoi
+from ..hoi_stats import (conn_hoi_stats, conn_hoi_boot, _surrogate_cov,
+                         _surrogate_index)
+from ..oinfo import compute_oinfo_chol
+from ..prepared import HOIData, _hoi_cov, _hoi_data
+from .test_conn_oinfo import _get_data
+
+
+def test_surrogate_cov():
+    """Test the covariance of the surrogates against resampled data."""
+    x, y, times, roi = _get_data()
+    rng = np.random.default_rng(0)
+    for _y, surrogate in [(None, 'shuffle'), (None, 'shift'), (y, 'shuffle')]:
+        prep = HOIData(x, y=_y, times=times, roi=roi)
+        n_vars = 5 if _y is None else 1
+        n = 10 if surrogate == 'shift' else 100
+        index = _surrogate_index(rng, 3, n_vars, n, surrogate)
+        c_s = _surrogate_cov(prep, index, surrogate)
+        assert c_s.shape == (10, 3) + prep.cov.shape[1:]
+        for s in range(3):
+            if _y is not None:
+                c_ref = _hoi_cov(prep.x, prep.y[index[s, 0]])
+            elif surrogate == 'shuffle':
+                x_s = prep.x[:, np.arange(5)[:, np.newaxis], index[s]]
+                c_ref = _hoi_cov(x_s, None)
+            else:
+                # each region is shifted along the time points
+                shift = index[s, :, 0]
+                x_s = np.stack([np.roll(prep.x[:, r], -shift[r], axis=0)
+                                for r in range(5)], 1)
+                c_ref = _hoi_cov(x_s, None)
+            np.testing.assert_allclose(c_s[:, s], c_ref, atol=1e-12)
+
+
+def test_conn_hoi_stats():
+    """Test the p-values and the corrected threshold of the O-info."""
+    x, y, times, roi = _get_data()
+    kw = dict(times=times, roi=roi, minsize=3, maxsize=4)
+    o_ref = conn_hoi(x, **kw)
+    stats = conn_hoi_stats(x, n_perm=50, random_state=0, **kw)
+    np.testing.assert_allclose(stats['oinfo'].data, o_ref.data)
+    np.testing.assert_array_equal(stats['roi'], o_ref['roi'])
+    for name in ['pvalues', 'pvalues_corr']:
+        pv = stats[name].data
+        assert ((pv >= 1. / 51) & (pv <= 1.)).all()
+    assert (stats['pvalues_corr'] >= stats['pvalues']).all()
+
+    # r2 = r0 + r1 is redundant with both at every time point
+    pv_corr = stats['pvalues_corr'].sel(roi='r0-r1-r2')
+    assert (pv_corr == 1. / 51).all()
+    is_signi = np.abs(stats['oinfo']) >= stats.attrs['threshold']
+    assert is_signi.sel(roi='r0-r1-r2').all()
+    np.testing.assert_array_equal(is_signi, stats['pvalues_corr'] <= .05)
+
+    # same surrogates with the same seed, in batches or not
+    stats_mem = conn_hoi_stats(x, n_perm=50, random_state=0, max_memory=1,
+                               **kw)
+    np.testing.assert_allclose(stats_mem['pvalues'], stats['pvalues'])
+
+    # time-shifted surrogates, r2 = r0 + r1 only at the same time points
+    stats = conn_hoi_stats(x, n_perm=50, surrogate='shift', random_state=0,
+                           **kw)
+    assert stats.attrs['surrogate'] == 'shift'
+    assert (stats['pvalues'].sel(roi='r0-r1-r2') <= .05).all()
+
+
+def test_conn_hoi_stats_task_related():
+    """Test the surrogates of the task-related O-info."""
+    x, y, times, roi = _get_data()
+    y = x[:, 0, :].mean(-1) + x[:, 1, :].mean(-1)
+    prep = HOIData(x, y=y, times=times, roi=roi)
+    stats = conn_hoi_stats(prep, minsize=2, maxsize=3, n_perm=20,
+                           tail='synergy', random_state=0)
+    o_ref = conn_hoi(prep, minsize=2, maxsize=3)
+    np.testing.assert_allclose(stats['oinfo'].data, o_ref.data)
+    assert stats.attrs['task_related']
+    assert np.isfinite(stats.attrs['threshold'])
+
+    # the behaviour can't be shifted in time
+    with pytest.raises(ValueError, match="shift"):
+        conn_hoi_stats(prep, surrogate='shift')
+
+
+def test_conn_hoi_boot():
+    """Test the bootstrap confidence intervals of the O-info."""
+    x, y, times, roi = _get_data(n_times=4)
+    for _y in [None, y]:
+        prep = HOIData(x, y=_y, times=times, roi=roi)
+        stats = conn_hoi_boot(prep, minsize=2, maxsize=3, n_boot=20,
+                              random_state=0)
+        o_ref = conn_hoi(prep, minsize=2, maxsize=3)
+        np.testing.assert_allclose(stats['oinfo'].data, o_ref.data, atol=1e-12)
+        np.testing.assert_array_equal(stats['roi'], o_ref['roi'])
+        assert (stats['ci_low'] <= stats['ci_high']).all()
+
+        # O-info of the resampled trials
+        w = bootstrap_weights(20, 100, random_state=0)
+        mult = [0, 1, 2] if _y is None else [0, 1, 5]
+        o_boot = []
+        for b in range(20):
+            x_b = np.repeat(_hoi_data(prep.x, prep.y), w[b], axis=-1)
+            x_b = x_b - x_b.mean(-1, keepdims=True)
+            c_b = cov_gauss_nd(x_b)[:, mult][..., mult]
+            o_boot += [compute_oinfo_chol(c_b)]
+        ci_ref = np.percentile(o_boot, [2.5, 97.5], axis=0)
+        name = 'r0-r1-r2' if _y is None else 'r0-r1-beh'
+        np.testing.assert_allclose(stats['ci_low'].sel(roi=name), ci_ref[0],
+                                   atol=1e-12)
+        np.testing.assert_allclose(stats['ci_high'].sel(roi=name), ci_ref[1],
+                                   atol=1e-12)
+
+        # the same intervals are obtained in batches of resamples
+        stats_mem = conn_hoi_boot(prep, minsize=2, maxsize=3, n_boot=20,
+                                  max_memory=1, random_state=0)
+        np.testing.assert_allclose(stats_mem['ci_low'], stats['ci_low'],
+                                   atol=1e-12)
+        np.testing.assert_allclose(stats_mem['ci_high'], stats['ci_high'],
+                                   atol=1e-12)
+
+
+def test_conn_hoi_boot_memory():
+    """Test that the bootstrap stays within the memory budget."""
+    x, _, times, roi = _get_data(n_roi=40, n_times=2)
+    prep = HOIData(x, times=times, roi=roi)
+    # the covariances of all of the resamples take 8 * 40**2 * 500 = 6.4MB
+    tracemalloc.start()
+    try:
+        stats = conn_hoi_boot(prep, minsize=2, maxsize=2, n_boot=500,
+                              max_memory='1MB', random_state=0)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    # budget and outputs
+    assert peak < 1e6 + 5 * stats['oinfo'].nbytes
+    stats_ref = conn_hoi_boot(prep, minsize=2, maxsize=2, n_boot=500,
+                              random_state=0)
+    np.testing.assert_allclose(stats['ci_low'], stats_ref['ci_low'],
+                               atol=1e-12)
+
+
+def test_conn_hoi_stats_on_error():
+    """Test the number of failed O-info of the data and the resamples."""
+    x, _, times, roi = _get_data(n_times=4)
+    # null variance of r1 at two time points, i.e. 4 pairs
+    prep = HOIData(x, times=times, roi=roi)
+    prep.x[[1, 2], 1, :] = 0.
+    kw = dict(minsize=2, maxsize=2, on_error='nan', random_state=0)
+    stats = conn_hoi_stats(prep, n_perm=10, **kw)
+    assert stats.attrs['n_failed'] == 2 * 4
+    assert stats.attrs['n_failed_surrogates'] == 2 * 4 * 10
+    stats = conn_hoi_boot(prep, n_boot=10, max_memory=1, **kw)
+    assert stats.attrs['n_failed'] == 2 * 4
+    assert stats.attrs['n_failed_boot'] == 2 * 4 * 10
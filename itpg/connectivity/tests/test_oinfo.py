@@ -0,0 +1,81 @@
+"""Tests for O-information functions."""
+# Authors: Christian Ferreyra, chrisferreyra13@gmail.com
+# Date: 2023
+# License: MIT License
+
+
+import numpy as np
+import pytest
+
+from ...entropy.entropy_gaussian import cov_gauss_nd
+from ..oinfo import (compute_oinfo, compute_oinfo_cov, compute_oinfo_chol,
+                     compute_oinfo_loop)
+
+
+def _get_ind(nvars):
+    """Get the leave-one-out indices."""
+    vec = np.arange(nvars)
+    return np.array([np.roll(vec, -shift) for shift in range(nvars)])[:, 1:]
+
+
+def _get_data(n_times=5, n_vars=4, n_trials=300, seed=0):
+    """Correlated gaussian data of shape (n_times, n_vars, n_trials)."""
+    rng = np.random.default_rng(seed)
+    x = rng.standard_normal((n_times, n_vars, n_trials))
+    x[:, -1, :] += x[:, :-1, :].sum(1)
+    return x - x.mean(-1, keepdims=True)
+
+
+def test_compute_oinfo_cov():
+    """Test O-info from covariance sub-blocks."""
+    x = _get_data()
+    ind = _get_ind(x.shape[1])
+
+    o_true = [compute_oinfo_loop(x[k]) for k in range(x.shape[0])]
+    np.testing.assert_array_almost_equal(compute_oinfo(x, ind), o_true)
+    np.testing.assert_array_almost_equal(
+        compute_oinfo_cov(cov_gauss_nd(x), ind), o_true)
+
+    # sub-block of a larger covariance
+    mult = np.array([0, 2, 3])
+    c = cov_gauss_nd(x)[:, mult[:, np.newaxis], mult[np.newaxis, :]]
+    np.testing.assert_array_almost_equal(
+        compute_oinfo_cov(c, _get_ind(3)),
+        compute_oinfo(x[:, mult, :], _get_ind(3)))
+
+
+def test_compute_oinfo_chol():
+    """Test O-info from a single cholesky factorization."""
+    for nvars in [2, 3, 5]:
+        x = _get_data(n_vars=nvars)
+        ind = _get_ind(nvars)
+
+        o_true = [compute_oinfo_loop(x[k]) for k in range(x.shape[0])]
+        o_chol = compute_oinfo_chol(cov_gauss_nd(x))
+        np.testing.assert_array_almost_equal(o_chol, o_true)
+        np.testing.assert_array_almost_equal(o_chol, compute_oinfo(x, ind))
+
+
+def test_compute_oinfo_on_error():
+    """Test the O-info of covariances that are not positive definite."""
+    for nvars in [4, 7]:
+        x = _get_data(n_times=20, n_vars=nvars)
+        ind = _get_ind(nvars)
+        c = cov_gauss_nd(x)
+        o_true = compute_oinfo_cov(c, ind)
+
+        # null variance at two time points
+        c[[3, 11], 1, :] = c[[3, 11], :, 1] = 0.
+        healthy = np.ones(20, dtype=bool)
+        healthy[[3, 11]] = False
+        with pytest.raises(np.linalg.LinAlgError):
+            compute_oinfo_chol(c)
+        for compute in [compute_oinfo_chol,
+                        lambda c, **kw: compute_oinfo_cov(c, ind, **kw)]:
+            o, failed = compute(c, on_error='nan', return_failed=True)
+            np.testing.assert_array_equal(failed, ~healthy)
+            assert np.isnan(o[~healthy]).all()
+            np.testing.assert_array_almost_equal(o[healthy], o_true[healthy])
+            # the ridge makes the variance positive
+            o = compute(c, on_error='ridge')
+            assert np.isfinite(o).all()
@@ -0,0 +1,78 @@
+"""Tests for the preprocessed data of higher order interactions."""
+# Authors: Christian Ferreyra, chrisferreyra13@gmail.com
+# Date: 2023
+# License: MIT License
+
+import numpy as np
+
+from ..conn_oinfo import conn_hoi
+from ..hoi_search import conn_hoi_beam
+from ..prepared import HOIData, _hoi_cov
+from .test_conn_oinfo import _get_data
+
+
+def test_hoi_data_conn_hoi():
+    """Test that conn_hoi gives the same O-info from prepared data."""
+    x, y, times, roi = _get_data()
+    for _y in [None, y]:
+        prep = HOIData(x, y=_y, times=times, roi=roi)
+        for method in ['cov', 'chol', 'data']:
+            o_ref = conn_hoi(x, y=_y, times=times, roi=roi, method=method,
+                             minsize=2, maxsize=4)
+            o_prep = conn_hoi(prep, method=method, minsize=2, maxsize=4)
+            np.testing.assert_allclose(o_prep.data, o_ref.data)
+            np.testing.assert_array_equal(o_prep['roi'], o_ref['roi'])
+            assert o_prep.attrs == o_ref.attrs
+
+    # the beam search also accepts prepared data
+    prep = HOIData(x, y=y, times=times, roi=roi)
+    o_ref = conn_hoi_beam(x, y=y, times=times, roi=roi, maxsize=4)
+    o_prep = conn_hoi_beam(prep, maxsize=4)
+    np.testing.assert_allclose(o_prep.data, o_ref.data)
+
+
+def test_hoi_data_cov_reused():
+    """Test that the covariance is computed once and shared by subsets."""
+    x, y, times, roi = _get_data()
+    prep = HOIData(x, y=y, times=times, roi=roi)
+    c = prep.cov
+    conn_hoi(prep, minsize=2, maxsize=3)
+    assert prep.cov is c
+    np.testing.assert_array_equal(c, _hoi_cov(prep.x, prep.y))
+
+    # contiguous regions are views, the others are copies
+    sub = prep.subset()
+    assert np.shares_memory(sub.x, prep.x)
+    assert np.shares_memory(sub.cov, prep.cov)
+    sub = prep.subset(roi=['r1', 'r2'], task_related=False)
+    assert np.shares_memory(sub.x, prep.x)
+    assert np.shares_memory(sub.cov, prep.cov)
+    np.testing.assert_array_equal(sub.cov, c[:, 1:3, 1:3])
+    assert not np.shares_memory(prep.subset(roi=['r3', 'r0']).x, prep.x)
+
+    # subsets of regions, with and without the behaviour
+    for task_related in [True, False]:
+        sub = prep.subset(roi=['r3', 'r0', 'r2'], task_related=task_related)
+        assert sub.is_task_related == task_related
+        assert np.shares_memory(sub.y, prep.y) if task_related else (
+            sub.y is None)
+        np.testing.assert_allclose(sub.cov, _hoi_cov(sub.x, sub.y))
+        o_ref = conn_hoi(x[:, [3, 0, 2], :], y=y if task_related else None,
+                         times=times, roi=roi[[3, 0, 2]], minsize=2,
+                         maxsize=3)
+        o_sub = conn_hoi(sub, minsize=2, maxsize=3)
+        np.testing.assert_allclose(o_sub.data, o_ref.data)
+        np.testing.assert_array_equal(o_sub['roi'], o_ref['roi'])
+
+
+def test_hoi_data_float32():
+    """Test that the dtype of the prepared data is used by conn_hoi."""
+    x, y, times, roi = _get_data()
+    prep = HOIData(x, y=y, times=times, roi=roi, dtype='float32')
+    assert prep.x.dtype == np.float32
+    assert prep.cov.dtype == np.float32
+    o_prep = conn_hoi(prep, minsize=2, maxsize=3)
+    o_ref = conn_hoi(x, y=y, times=times, roi=roi, minsize=2, maxsize=3,
+                     dtype='float32')
+    np.testing.assert_allclose(o_prep.data, o_ref.data)
+    assert o_prep.attrs['dtype'] == 'float32'
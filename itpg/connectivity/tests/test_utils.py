@@ -0,0 +1,71 @@
+"""Tests for higher order interactions utils."""
+# Authors: Christian Ferreyra, chrisferreyra13@gmail.com
+# Date: 2023
+# License: MIT License
+
+
+import itertools
+
+import numpy as np
+import pytest
+
+from ..utils import (parse_memory, get_chunk_size, get_combinations,
+                     get_shard_range, CombinationIndex)
+
+
+def test_parse_memory():
+    """Test memory size parsing."""
+    assert parse_memory(1000) == 1000
+    assert parse_memory('2KB') == 2048
+    assert parse_memory('1.5 mb') == int(1.5 * 1024 ** 2)
+    assert parse_memory('2GB') == 2 * 1024 ** 3
+    with pytest.raises(ValueError):
+        parse_memory('2 gigas')
+
+    assert get_chunk_size('1KB', 100, 1000) == 10
+    assert get_chunk_size('1KB', 1e6, 1000) == 1
+    assert get_chunk_size('1GB', 100, 1000) == 1000
+
+
+def test_get_combinations_range():
+    """Test the selection of a range of combinations."""
+    roi = np.array(['r0', 'r1', 'r2', 'r3'])
+    combs, roi_st = get_combinations(4, 2, roi)
+    combs_sl, roi_sl = get_combinations(4, 2, roi, start=2, stop=5)
+    np.testing.assert_array_equal(combs_sl, combs[2:5])
+    assert roi_sl == roi_st[2:5]
+    assert get_combinations(4, 2, roi, start=6)[0].shape == (0, 2)
+
+
+def test_get_shard_range():
+    """Test that the shards cover all the items."""
+    ranges = [get_shard_range(10, (i, 3)) for i in range(3)]
+    assert ranges == [(0, 3), (3, 6), (6, 10)]
+    with pytest.raises(ValueError):
+        get_shard_range(10, (3, 3))
+
+
+def test_combination_index():
+    """Test the lazy combination index against itertools."""
+    for n, k in [(1, 1), (6, 1), (6, 6), (8, 3), (10, 4)]:
+        combs = np.array(list(itertools.combinations(range(n), k)))
+        idx = CombinationIndex(n, k)
+        assert len(idx) == len(combs)
+        np.testing.assert_array_equal(idx[:], combs)
+        np.testing.assert_array_equal(idx[-1], combs[-1])
+        np.testing.assert_array_equal(idx[1::3], combs[1::3])
+        np.testing.assert_array_equal(idx.rank(combs), np.arange(len(combs)))
+        np.testing.assert_array_equal(
+            np.concatenate(list(idx.iter_chunks(chunk_size=7))), combs)
+
+    # large index without building the combinations
+    idx = CombinationIndex(100, 5)
+    assert len(idx) == 75287520
+    np.testing.assert_array_equal(idx[len(idx) - 1], [95, 96, 97, 98, 99])
+    assert idx.rank(idx[123456]) == 123456
+
+    # target and labels
+    idx = CombinationIndex(3, 2, target=3)
+    np.testing.assert_array_equal(idx[0], [0, 1, 3])
+    assert idx.labels(['a', 'b', 'c', 'beh'], start=1) == ['a-c-beh',
+                                                           'b-c-beh']
@@ -3,19 +3,329 @@
 # Modified: Christian Ferreyra, chrisferreyra13@gmail.com
 # Date: 01/2023
 
+import re
+
 import numpy as np
-import itertools
+from scipy.special import comb
+
+MEMORY_UNITS = {'B': 1, 'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3,
+                'TB': 1024 ** 4}
+
+
+class CombinationIndex(object):
+    """Lazy index of the combinations of k elements among n.
+
+    The combinations follow the lexicographic order of
+    :func:`itertools.combinations` but are only built when accessed. Going
+    from a rank to a combination (and back) uses the combinatorial number
+    system so that any part of the combinations can be built without the
+    previous ones.
+
+    Parameters
+    ----------
+    n : int
+        Number of elements.
+    k : int
+        Number of elements per combination.
+    target : int | None
+        Index appended as a final column to every combination (e.g. the
+        behaviour for task-related HOI).
+    """
+
+    def __init__(self, n, k, target=None):
+        assert 0 < k <= n
+        self.n, self.k, self.target = n, k, target
+        self._size = comb(n, k, exact=True)
+        if self._size > np.iinfo(np.int64).max:
+            raise ValueError(f"Too many combinations of {k} among {n}")
+        # binomial coefficients C(d, m) of shape (n, k + 1)
+        self._binom = np.array(
+            [[comb(d, m, exact=True) for m in range(k + 1)] for d in range(n)],
+            dtype=np.int64)
+
+    def __len__(self):
+        return self._size
+
+    def __repr__(self):
+        return f"CombinationIndex(n={self.n}, k={self.k}, size={len(self)})"
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return self.unrank(np.arange(*key.indices(len(self))))
+        if np.ndim(key) == 0:
+            key = int(key)
+            return self.unrank([key + len(self) if key < 0 else key])[0]
+        return self.unrank(key)
+
+    def __iter__(self):
+        for chunk in self.iter_chunks():
+            yield from chunk
+
+    def rank(self, combs):
+        """Get the ranks of combinations.
+
+        Parameters
+        ----------
+        combs : array_like
+            Sorted combinations of shape (n_combs, k). The target column can
+            be included.
+
+        Returns
+        -------
+        ndarray
+            Ranks of shape (n_combs,).
+        """
+        combs = np.atleast_2d(combs)[:, :self.k]
+        d = self.n - 1 - combs
+        m = np.arange(self.k, 0, -1)
+        return len(self) - 1 - self._binom[d, m].sum(-1)
 
+    def unrank(self, ranks):
+        """Get the combinations from their ranks.
 
-def get_combinations(n, k, roi, task_related=False):
-    """Get combinations."""
-    combs = np.array(list(itertools.combinations(np.arange(n), k)))
+        Parameters
+        ----------
+        ranks : array_like
+            Ranks of the combinations, of shape (n_combs,).
 
+        Returns
+        -------
+        ndarray
+            Combinations of shape (n_combs, k), or (n_combs, k + 1) with a
+            target.
+        """
+        ranks = np.asarray(ranks, dtype=np.int64).reshape(-1)
+        if len(ranks) and ((ranks.min() < 0) or (ranks.max() >= len(self))):
+            raise IndexError(f"Ranks should be in [0, {len(self)})")
+        if self.target is None:
+            combs = np.zeros((len(ranks), self.k), dtype=int)
+        else:
+            combs = np.full((len(ranks), self.k + 1), self.target, dtype=int)
+
+        # greedy decoding of N = sum_i C(d_i, k - i) with d_i = n - 1 - c_i
+        cnum = len(self) - 1 - ranks
+        for i in range(self.k):
+            binom = self._binom[:, self.k - i]
+            d = np.searchsorted(binom, cnum, side='right') - 1
+            combs[:, i] = self.n - 1 - d
+            cnum = cnum - binom[d]
+
+        return combs
+
+    def iter_chunks(self, chunk_size=4096, start=0, stop=None):
+        """Iterate over chunks of combinations.
+
+        Parameters
+        ----------
+        chunk_size : int | 4096
+            Number of combinations per chunk.
+        start, stop : int | 0, None
+            Ranks of the first and last (excluded) combinations.
+
+        Yields
+        ------
+        ndarray
+            Combinations of shape (chunk_size, k).
+        """
+        stop = len(self) if stop is None else min(stop, len(self))
+        for _start in range(start, stop, chunk_size):
+            yield self.unrank(np.arange(_start, min(_start + chunk_size,
+                                                    stop)))
+
+    def labels(self, names, start=0, stop=None, sep='-'):
+        """Get the names of combinations.
+
+        Parameters
+        ----------
+        names : array_like
+            Names of the elements (including the target if any).
+        start, stop : int | 0, None
+            Ranks of the first and last (excluded) combinations.
+        sep : str | '-'
+            Separator between the names.
+
+        Returns
+        -------
+        list
+            Names of the combinations.
+        """
+        names = np.asarray(names)
+        return [sep.join(r) for combs in self.iter_chunks(start=start,
+                                                          stop=stop)
+                for r in names[combs].tolist()]
+
+
+def get_combinations(n, k, roi, task_related=False, start=None, stop=None):
+    """Get combinations.
+
+    The combinations are in lexicographic order and the optional start and
+    stop ranks only select a part of them.
+    """
     # add target (behaviour) as a final columns
-    if task_related:
-        combs = np.c_[combs, np.full((combs.shape[0],), n)]
+    idx = CombinationIndex(n, k, target=n if task_related else None)
+    start, stop, _ = slice(start, stop).indices(len(idx))
+    combs = idx[start:stop]
 
     # build region names
-    roi_st = ['-'.join(r) for r in roi[combs].tolist()]
+    roi_st = idx.labels(roi, start=start, stop=stop)
 
     return combs, roi_st
+
+
+def parse_memory(max_memory):
+    """Get a memory size in bytes.
+
+    Parameters
+    ----------
+    max_memory : int | float | str
+        Memory size either in bytes or as a string with units (e.g. '500MB',
+        '2GB').
+
+    Returns
+    -------
+    int
+        Memory size in bytes.
+    """
+    if isinstance(max_memory, (int, float)):
+        nbytes = max_memory
+    elif isinstance(max_memory, str):
+        match = re.fullmatch(r'\s*([\d.]+)\s*([KMGT]?B)\s*',
+                             max_memory.upper())
+        if match is None:
+            raise ValueError(f"Can't interpret memory size '{max_memory}', "
+                             "use for example '500MB' or '2GB'")
+        nbytes = float(match.group(1)) * MEMORY_UNITS[match.group(2)]
+    else:
+        raise TypeError("max_memory should be a number of bytes or a string")
+
+    return int(nbytes)
+
+
+def get_chunk_size(max_memory, item_nbytes, n_items):
+    """Get the number of items that fit in a memory budget.
+
+    Parameters
+    ----------
+    max_memory : int | float | str
+        Memory budget (see :func:`parse_memory`).
+    item_nbytes : int
+        Memory required per item in bytes.
+    n_items : int
+        Total number of items.
+
+    Returns
+    -------
+    int
+        Number of items per chunk, at least one.
+    """
+    chunk_size = parse_memory(max_memory) // max(int(item_nbytes), 1)
+    return int(min(max(chunk_size, 1), max(n_items, 1)))
+
+
+def get_shard_range(n_items, shard):
+    """Get the range of items computed by a shard.
+
+    Parameters
+    ----------
+    n_items : int
+        Total number of items.
+    shard : tuple
+        Tuple (i, n_shards) of the shard index and the number of shards.
+
+    Returns
+    -------
+    tuple
+        Start and stop ranks of the items of the shard.
+    """
+    i, n_shards = shard
+    if not 0 <= i < n_shards:
+        raise ValueError(f"Shard index should be in [0, {n_shards}), got {i}")
+    return i * n_items // n_shards, (i + 1) * n_items // n_shards
+
+
+def join_labels(names, members, sep='-'):
+    """Join the names of the regions of multiplets.
+
+    Parameters
+    ----------
+    names : array_like
+        Names of the regions.
+    members : array_like
+        Indices of the regions of shape (..., max_size), padded with -1.
+    sep : str | '-'
+        Separator between the names.
+
+    Returns
+    -------
+    ndarray
+        Names of the multiplets of shape (...).
+    """
+    names = np.r_[np.asarray(names, dtype=str), ['']]
+    members = np.asarray(members)
+    labels = [sep.join([r for r in m if r]) for m in names[members.reshape(
+        -1, members.shape[-1])].tolist()]
+    return np.array(labels, dtype=str).reshape(members.shape[:-1])
+
+
+def get_multiplet_members(oinfo):
+    """Get the regions of the multiplets with integer coordinates.
+
+    Parameters
+    ----------
+    oinfo : array_like
+        O-info DataArray returned by :func:`conn_hoi` with roi_coords='int'.
+
+    Returns
+    -------
+    ndarray
+        Indices of the regions of each multiplet in the 'roi_names' attribute,
+        of shape (n_multiplets, max_size) and padded with -1.
+    """
+    cols = sorted([c for c in oinfo.coords if c.startswith('member_')],
+                  key=lambda c: int(c.split('_')[1]))
+    if not len(cols):
+        raise ValueError("The multiplets don't have integer coordinates, use "
+                         "roi_coords='int' in conn_hoi")
+    return np.stack([oinfo[c].data for c in cols], -1)
+
+
+def get_multiplet_labels(oinfo, sep='-'):
+    """Get the names of the multiplets with integer coordinates.
+
+    Parameters
+    ----------
+    oinfo : array_like
+        O-info DataArray returned by :func:`conn_hoi` with roi_coords='int'.
+    sep : str | '-'
+        Separator between the names of the regions.
+
+    Returns
+    -------
+    list
+        Names of the multiplets (e.g. 'r0-r1-r2').
+    """
+    members = get_multiplet_members(oinfo)
+    return join_labels(oinfo.attrs['roi_names'], members, sep=sep).tolist()
+
+
+def select_multiplets(oinfo, contains):
+    """Select the multiplets containing some regions.
+
+    Parameters
+    ----------
+    oinfo : array_like
+        O-info DataArray returned by :func:`conn_hoi` with roi_coords='int'.
+    contains : str | list
+        Name(s) of the regions that the multiplets should all contain.
+
+    Returns
+    -------
+    array_like
+        O-info of the selected multiplets.
+    """
+    members = get_multiplet_members(oinfo)
+    names = list(oinfo.attrs['roi_names'])
+    is_sel = np.ones((len(members),), dtype=bool)
+    for r in np.atleast_1d(contains):
+        is_sel &= (members == names.index(r)).any(-1)
+    return oinfo.isel(roi=is_sel)
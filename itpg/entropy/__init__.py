@@ -3,4 +3,9 @@
 # License: MIT License
 
 from .entropy_gaussian import (entropy_gauss, entropy_gauss_loop,
-                               entropy_gauss_nd)
+                               entropy_gauss_nd, entropy_gauss_cov_nd,
+                               entropy_gauss_sub_nd, cov_gauss_nd,
+                               cov_gauss_sub_nd, logdet_nd,
+                               cov_gauss_weighted_nd, cov_gauss_cross_nd,
+                               bootstrap_weights,
+                               entropy_gauss_boot_nd)
@@ -5,25 +5,353 @@
 
 import numpy as np
 
+from frites.io import logger
 
-def entropy_gauss_nd(x):
-    """Entropy of a gaussian tensor of shape (..., n_vars, n_trials)."""
-    nvarx, ntrl = x.shape[-2], x.shape[-1]
-    # sample covariance
-    # the variables are gaussian with zero mean
-    # so cov(x,x) = sum(xx^T)/N-1
+from ..backend import get_kernel
+
+
+# number of trials of the single precision products accumulated in float64
+COV_BLOCK_SIZE = 256
+
+
+def cov_gauss_nd(x):
+    """Covariance of a gaussian tensor of shape (..., n_vars, n_trials).
+
+    The variables are supposed to be gaussian with zero mean (e.g. after
+    copnorm and demeaning) so cov(x,x) = sum(xx^T)/N-1. The returned array has
+    a shape of (..., n_vars, n_vars).
+
+    For single precision data, the products of blocks of COV_BLOCK_SIZE
+    trials are computed in single precision and summed in double precision,
+    so that the rounding errors don't grow with the number of trials. The
+    covariance is then returned in single precision.
+    """
+    ntrl = x.shape[-1]
+    if x.dtype == np.float32:
+        c = np.zeros(x.shape[:-1] + x.shape[-2:-1], dtype=np.float64)
+        for k in range(0, ntrl, COV_BLOCK_SIZE):
+            x_blk = x[..., k:k + COV_BLOCK_SIZE]
+            c += np.einsum('...ij, ...kj->...ik', x_blk, x_blk)
+        c /= float(ntrl - 1.)
+        return c.astype(np.float32)
     c = np.einsum('...ij, ...kj->...ik', x, x)
     c /= float(ntrl - 1.)
+    return c
+
+
+def cov_gauss_cross_nd(x, y):
+    """Cross-covariances of a gaussian tensor with shared vectors.
+
+    The tensor x of shape (..., n_vars, n_trials) and the vectors y of shape
+    (n_trials,) or (n_trials, n_vec) are supposed to be gaussian with zero
+    mean. The vectors are the same for all of the leading dimensions of x
+    (e.g. the behaviour at every time point) so they are never broadcast.
+    As in cov_gauss_nd, the products of blocks of COV_BLOCK_SIZE trials are
+    summed in double precision. The returned array has a shape of
+    (..., n_vars) or (..., n_vars, n_vec) and is in double precision.
+    """
+    ntrl = x.shape[-1]
+    c = np.zeros(x.shape[:-1] + y.shape[1:], dtype=np.float64)
+    for k in range(0, ntrl, COV_BLOCK_SIZE):
+        c += x[..., k:k + COV_BLOCK_SIZE] @ y[k:k + COV_BLOCK_SIZE]
+    c /= float(ntrl - 1.)
+    return c
+
+
+def cov_gauss_sub_nd(c, ind):
+    """Sub-blocks of a covariance (..., n_vars, n_vars) for sets of variables.
+
+    The sets of variables are given by an integer array of shape
+    (n_sets, k) and the returned array has a shape of (..., n_sets, k, k).
+    """
+    ind = np.asarray(ind)
+    return c[..., ind[..., :, np.newaxis], ind[..., np.newaxis, :]]
+
+
+def bootstrap_weights(n_boot, n_trials, random_state=None):
+    """Trial weights of bootstrap resamples of shape (n_boot, n_trials).
+
+    Each resample draws n_trials trials with replacement and is described by
+    the number of times each trial is drawn (multinomial counts).
+    """
+    rng = np.random.default_rng(random_state)
+    return rng.multinomial(n_trials, np.full((n_trials,), 1. / n_trials),
+                           size=n_boot)
+
+
+def cov_gauss_weighted_nd(x, weights):
+    """Covariances of a tensor (..., n_vars, n_trials) for trial weights.
+
+    The weights of shape (n_sets, n_trials), e.g. bootstrap counts (see
+    bootstrap_weights), are the number of times each trial is repeated. The
+    covariances of all of the sets of weights are obtained from products of
+    the pairwise products of the variables with the weights, without
+    building the resampled data. The pairwise products are formed one row of
+    the covariance at a time so that they take at most the memory of x.
+    Unlike cov_gauss_nd, the weighted data are demeaned. The returned array
+    has a shape of (..., n_sets, n_vars, n_vars) and is in double precision.
+    """
+    n_vars = x.shape[-2]
+    w = np.asarray(weights, dtype=np.float64)
+    n_w = w.sum(-1)
+    x = x.astype(np.float64, copy=False)
+
+    # weighted means (..., n_vars, n_sets)
+    m_x = (x @ w.T) / n_w
+    c = np.empty(x.shape[:-2] + (len(w), n_vars, n_vars))
+    for i in range(n_vars):
+        # weighted sums of the products with the next variables
+        # (..., n_vars - i, n_sets)
+        s_xx = (x[..., i:i + 1, :] * x[..., i:, :]) @ w.T
+        s_xx -= n_w * m_x[..., i:i + 1, :] * m_x[..., i:, :]
+        s_xx /= n_w - 1.
+        s_xx = np.swapaxes(s_xx, -1, -2)
+        c[..., i, i:] = s_xx
+        c[..., i:, i] = s_xx
+    return c
+
+
+def _logdet_unrolled(c):
+    """Log-determinant of small matrices using an unrolled LDL^T.
+
+    Each element of the matrices is a vector over the batch dimensions so
+    that there is no per-matrix overhead, which is faster than a batched
+    cholesky for the smallest matrices. The matrices that are not positive
+    definite are flagged as failed, with a NaN log-determinant.
+    """
+    n = c.shape[-1]
+    # lower triangular factor and diagonal of c = L*D*L^T
+    lo, d = [[None] * n for _ in range(n)], [None] * n
+    logdet = np.zeros(c.shape[:-2])
+    # the pivots are positive for positive definite matrices
+    failed = np.zeros(c.shape[:-2], dtype=bool)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for j in range(n):
+            d[j] = c[..., j, j].copy()
+            for k in range(j):
+                d[j] -= lo[j][k] * lo[j][k] * d[k]
+            failed |= d[j] <= 0
+            logdet += np.log(d[j])
+            for i in range(j + 1, n):
+                lo[i][j] = c[..., i, j].copy()
+                for k in range(j):
+                    lo[i][j] -= lo[i][k] * lo[j][k] * d[k]
+                lo[i][j] /= d[j]
+    if failed.any():
+        logdet[failed] = np.nan
+
+    return logdet, failed
+
+
+def _logdet_chol(c):
+    """Log-determinant of positive definite matrices from a cholesky."""
     # c = L*L.H in order to compute the determinant
     chc = np.linalg.cholesky(c)
     # |c|=|chc|^2, |chc|=(product of the diagonal elements of chc)
+    # log(|chc|^2) = 2*sum(log(diag(chc))) --> log of product is sum of log
+    return 2. * np.log(np.einsum('...ii->...i', chc)).sum(-1, dtype=float)
+
+
+def _bisect_failures(func, c):
+    """Apply func to a batch (n_batch, ...) and locate where it fails.
+
+    func is first applied to the whole batch, so that there is no overhead
+    without failure. Otherwise, the batch is split in halves until the
+    elements raising a LinAlgError are isolated.
+
+    Returns
+    -------
+    out : ndarray, shape (n_batch, ...)
+        Outputs of func, NaN for the failed elements.
+    failed : ndarray, shape (n_batch,)
+        Boolean array of the failed elements.
+    """
+    try:
+        return func(c), np.zeros(len(c), dtype=bool)
+    except np.linalg.LinAlgError:
+        if len(c) == 1:
+            return np.full(1, np.nan), np.ones(1, dtype=bool)
+        out_1, failed_1 = _bisect_failures(func, c[:len(c) // 2])
+        out_2, failed_2 = _bisect_failures(func, c[len(c) // 2:])
+        return np.r_[out_1, out_2], np.r_[failed_1, failed_2]
+
+
+# largest matrices for which the unrolled log-determinant is used
+LOGDET_UNROLLED_MAX = 5
+
+ON_ERROR = ['raise', 'nan', 'ridge', 'slogdet']
+
+
+def logdet_nd(c, on_error='raise', ridge=1e-6, return_failed=False):
+    """Log-determinant of positive definite matrices (..., n_vars, n_vars).
+
+    Matrices of up to LOGDET_UNROLLED_MAX variables use an unrolled
+    factorization, larger ones a batched cholesky decomposition. With a
+    jax or numba backend (see itpg.set_backend), a compiled kernel is used
+    instead.
+
+    Parameters
+    ----------
+    c : ndarray, shape (..., n_vars, n_vars)
+        Covariance matrices.
+    on_error : {'raise', 'nan', 'ridge', 'slogdet'}
+        What to do with the matrices that are not positive definite (e.g.
+        rank deficient). 'raise' raises a LinAlgError, 'nan' gives them a NaN
+        log-determinant, 'ridge' adds ridge times their mean variance (or
+        ridge if it is null) to their diagonal and 'slogdet' uses the LU
+        based np.linalg.slogdet.
+        Only the failed matrices are processed again and their number is
+        logged at the debug level (conn_hoi reports the total of a run).
+        Matrices that still fail, or with a negative determinant, get a NaN
+        log-determinant.
+    ridge : float
+        Relative regularization of the 'ridge' strategy.
+    return_failed : bool
+        If True, also return the boolean array of the failed matrices.
+
+    Returns
+    -------
+    logdet : ndarray, shape (...)
+        Log-determinants.
+    failed : ndarray, shape (...)
+        Matrices that are not positive definite, if return_failed is True.
+    """
+    assert on_error in ON_ERROR, f"on_error should be in {ON_ERROR}"
+    n, shape = c.shape[-1], c.shape[:-2]
+    kernel = get_kernel('logdet')
+    if kernel is not None:
+        # compiled kernel of the backend, NaN for the failed matrices
+        logdet = np.array(kernel(c), dtype=float)
+        failed = np.isnan(logdet)
+    elif n <= LOGDET_UNROLLED_MAX:
+        logdet, failed = _logdet_unrolled(c)
+    elif on_error == 'raise':
+        logdet, failed = _logdet_chol(c), np.zeros(shape, dtype=bool)
+    else:
+        logdet, failed = _bisect_failures(_logdet_chol, c.reshape(-1, n, n))
+        logdet, failed = logdet.reshape(shape), failed.reshape(shape)
+
+    if failed.any():
+        if on_error == 'raise':
+            raise np.linalg.LinAlgError("Matrix is not positive definite")
+        logger.debug(f"    {failed.sum()} / {failed.size} matrices are not "
+                     f"positive definite (on_error='{on_error}')")
+        c_f = c[failed]
+        if on_error == 'ridge':
+            var = np.einsum('...ii->...i', c_f).mean(-1)
+            var[~(var > 0)] = 1.
+            c_f = c_f + ridge * var[:, np.newaxis, np.newaxis] * np.eye(n)
+            logdet[failed] = logdet_nd(c_f, on_error='nan')
+        elif on_error == 'slogdet':
+            sign, logabsdet = np.linalg.slogdet(c_f)
+            logdet[failed] = np.where(sign > 0, logabsdet, np.nan)
+
+    return (logdet[()], failed[()]) if return_failed else logdet[()]
+
+
+def entropy_gauss_cov_nd(c, on_error='raise', return_failed=False):
+    """Entropy of a gaussian from its covariance (..., n_vars, n_vars).
+
+    See logdet_nd for the on_error strategies of the covariances that are
+    not positive definite and for return_failed.
+    """
+    nvarx = c.shape[-1]
 
     # entropy in nats
-    # 0.5*log(|chc|^2) = sum(log(diag(chc))) --> log of product is sum of log
-    hx = (np.log(np.einsum('...ii->...i', chc)).sum(-1)
-          + 0.5 * nvarx * (np.log(2 * np.pi) + 1.0))
+    logdet, failed = logdet_nd(c, on_error=on_error, return_failed=True)
+    hx = 0.5 * logdet + 0.5 * nvarx * (np.log(2 * np.pi) + 1.0)
 
-    return hx
+    return (hx, failed) if return_failed else hx
+
+
+def entropy_gauss_sub_nd(c, ind, on_error='raise', return_failed=False):
+    """Entropies of sets of variables from a covariance.
+
+    Parameters
+    ----------
+    c : ndarray, shape (..., n_vars, n_vars)
+        Covariance of all of the variables.
+    ind : array_like, shape (n_sets, k)
+        Indices of the variables of each set.
+    on_error : {'raise', 'nan', 'ridge', 'slogdet'}
+        Strategy for the covariances that are not positive definite (see
+        logdet_nd).
+    return_failed : bool
+        If True, also return the boolean array of the sets whose covariance
+        is not positive definite.
+
+    Returns
+    -------
+    ndarray, shape (..., n_sets)
+        Entropy of each set of variables in nats.
+    """
+    return entropy_gauss_cov_nd(cov_gauss_sub_nd(c, ind), on_error=on_error,
+                                return_failed=return_failed)
+
+
+def entropy_gauss_nd(x, on_error='raise', dtype=None,
+                     return_failed=False):
+    """Entropy of a gaussian tensor of shape (..., n_vars, n_trials).
+
+    See logdet_nd for the on_error strategies of the covariances that are
+    not positive definite and for return_failed. If dtype is np.float32, the
+    data and covariance are stored and multiplied in single precision (see
+    cov_gauss_nd) while the log-determinants are accumulated in double
+    precision.
+    """
+    if dtype is not None:
+        x = x.astype(dtype, copy=False)
+    # sample covariance
+    c = cov_gauss_nd(x)
+
+    return entropy_gauss_cov_nd(c, on_error=on_error,
+                                return_failed=return_failed)
+
+
+def entropy_gauss_boot_nd(x, n_boot=1000, ci=95, max_memory='10MB',
+                          random_state=None, on_error='raise'):
+    """Bootstrap confidence interval of the entropy of a gaussian tensor.
+
+    The tensor of shape (..., n_vars, n_trials) is resampled over the trials
+    using multinomial weights. The covariances of the resamples are computed
+    in batches of resamples that fit in max_memory (see
+    cov_gauss_weighted_nd), only their entropies being kept.
+
+    Parameters
+    ----------
+    x : ndarray, shape (..., n_vars, n_trials)
+        Gaussian tensor, e.g. copnormed data.
+    n_boot : int
+        Number of bootstrap resamples.
+    ci : float
+        Level of the percentile confidence interval, in percent.
+    max_memory : int | str
+        Memory budget of the covariances of a batch of resamples, in bytes
+        or as a string (e.g. '500MB', '2GB').
+    random_state : int | None
+        Seed of the random generator of the resamples.
+    on_error : {'raise', 'nan', 'ridge', 'slogdet'}
+        Strategy for the covariances that are not positive definite (see
+        logdet_nd).
+
+    Returns
+    -------
+    ndarray, shape (2, ...)
+        Lower and upper bounds of the entropy in nats.
+    """
+    # imported here as itpg.connectivity depends on this module
+    from ..connectivity.utils import get_chunk_size
+
+    w = bootstrap_weights(n_boot, x.shape[-1], random_state=random_state)
+    n_vars = x.shape[-2]
+    n_b = get_chunk_size(
+        max_memory, 8 * np.prod(x.shape[:-2]) * n_vars * (n_vars + 1),
+        n_boot)
+    h = np.empty(x.shape[:-2] + (n_boot,))
+    for b in range(0, n_boot, n_b):
+        h[..., b:b + n_b] = entropy_gauss_cov_nd(
+            cov_gauss_weighted_nd(x, w[b:b + n_b]), on_error=on_error)
+    return np.percentile(h, [(100. - ci) / 2., (100. + ci) / 2.], axis=-1)
 
 
 def entropy_gauss(x):
@@ -0,0 +1,169 @@
+"""Tests for gaussian entropy functions."""
+# Authors: Christian Ferreyra, chrisferreyra13@gmail.com
+# Date: 2023
+# License: MIT License
+
+
+import numpy as np
+import pytest
+
+from ..entropy_gaussian import (
+    entropy_gauss, entropy_gauss_nd, entropy_gauss_cov_nd,
+    entropy_gauss_sub_nd, cov_gauss_nd, cov_gauss_sub_nd, logdet_nd,
+    cov_gauss_weighted_nd, cov_gauss_cross_nd, bootstrap_weights,
+    entropy_gauss_boot_nd)
+
+
+def test_entropy_gauss_cov_nd():
+    """Test entropy computed from the covariance."""
+    rng = np.random.default_rng(0)
+    x = rng.standard_normal((4, 3, 200))
+
+    c = cov_gauss_nd(x)
+    assert c.shape == (4, 3, 3)
+
+    h_true = [entropy_gauss(x[k]) for k in range(4)]
+    np.testing.assert_array_almost_equal(entropy_gauss_cov_nd(c), h_true)
+    np.testing.assert_array_almost_equal(entropy_gauss_nd(x), h_true)
+
+
+def test_logdet_nd():
+    """Test the log-determinant of small and large matrices."""
+    rng = np.random.default_rng(0)
+    for n_vars in range(1, 9):
+        x = rng.standard_normal((2, 5, n_vars, 50))
+        c = cov_gauss_nd(x)
+        np.testing.assert_array_almost_equal(
+            logdet_nd(c), np.linalg.slogdet(c)[1])
+        # single matrix
+        np.testing.assert_almost_equal(
+            logdet_nd(c[0, 0]), np.linalg.slogdet(c[0, 0])[1])
+
+    # singular matrices raise like the cholesky decomposition
+    for n_vars in [3, 7]:
+        x = rng.standard_normal((4, n_vars, 50))
+        x[1, 1] = x[1, 0]
+        with pytest.raises(np.linalg.LinAlgError):
+            logdet_nd(cov_gauss_nd(x) - np.eye(n_vars) * 1e-10)
+
+
+def test_entropy_gauss_sub_nd():
+    """Test entropies of sets of variables from a covariance."""
+    rng = np.random.default_rng(0)
+    x = rng.standard_normal((4, 6, 200))
+    ind = np.array([[0, 2, 3], [5, 1, 4], [1, 2, 3]])
+
+    c = cov_gauss_nd(x)
+    c_sub = cov_gauss_sub_nd(c, ind)
+    assert c_sub.shape == (4, 3, 3, 3)
+    np.testing.assert_array_almost_equal(
+        c_sub[:, 1], cov_gauss_nd(x[:, [5, 1, 4]]))
+
+    h_true = np.stack([entropy_gauss_nd(x[:, i]) for i in ind], -1)
+    np.testing.assert_array_almost_equal(entropy_gauss_sub_nd(c, ind), h_true)
+
+
+def test_logdet_nd_on_error():
+    """Test the strategies for the matrices that are not positive definite."""
+    rng = np.random.default_rng(0)
+    for n_vars in [3, 7]:
+        x = rng.standard_normal((10, n_vars, 50))
+        # rank deficient matrices
+        x[[2, 7], 1] = x[[2, 7], 0]
+        c = cov_gauss_nd(x)
+        c[[2, 7]] -= 1e-10 * np.eye(n_vars)
+        healthy = np.ones(10, dtype=bool)
+        healthy[[2, 7]] = False
+        logdet_true = np.linalg.slogdet(c[healthy])[1]
+
+        logdet, failed = logdet_nd(c, on_error='nan', return_failed=True)
+        np.testing.assert_array_equal(failed, ~healthy)
+        assert np.isnan(logdet[~healthy]).all()
+        np.testing.assert_array_almost_equal(logdet[healthy], logdet_true)
+
+        # regularized matrices
+        logdet = logdet_nd(c, on_error='ridge', ridge=1e-3)
+        np.testing.assert_array_almost_equal(logdet[healthy], logdet_true)
+        var = np.einsum('...ii->...i', c[~healthy]).mean(-1)
+        np.testing.assert_array_almost_equal(
+            logdet[~healthy], np.linalg.slogdet(
+                c[~healthy] + 1e-3 * var[:, None, None] * np.eye(n_vars))[1])
+
+        # the lu decomposition of slogdet
+        logdet = logdet_nd(c, on_error='slogdet')
+        np.testing.assert_array_almost_equal(logdet[healthy], logdet_true)
+
+        with pytest.raises(np.linalg.LinAlgError):
+            entropy_gauss_cov_nd(c)
+        h = entropy_gauss_cov_nd(c, on_error='nan')
+        assert np.isnan(h).sum() == 2
+
+
+def test_entropy_gauss_float32():
+    """Test the single precision entropies against double precision."""
+    rng = np.random.default_rng(0)
+    x = rng.standard_normal((3, 4, 20000))
+    x[:, 3] += x[:, 0]
+    x -= x.mean(-1, keepdims=True)
+
+    # the covariance is accumulated over blocks of trials
+    c_64 = cov_gauss_nd(x)
+    c_32 = cov_gauss_nd(x.astype(np.float32))
+    assert c_32.dtype == np.float32
+    np.testing.assert_allclose(c_32, c_64, rtol=1e-6, atol=1e-6)
+
+    # error bound of the entropies
+    h_32 = entropy_gauss_nd(x, dtype=np.float32)
+    assert h_32.dtype == np.float64
+    np.testing.assert_allclose(h_32, entropy_gauss_nd(x), rtol=0, atol=1e-5)
+    for n_vars in [2, 7]:
+        x = rng.standard_normal((3, n_vars, 500))
+        np.testing.assert_allclose(entropy_gauss_nd(x, dtype=np.float32),
+                                   entropy_gauss_nd(x), rtol=0, atol=1e-5)
+
+
+def test_cov_gauss_weighted_nd():
+    """Test the weighted covariances against resampled data."""
+    rng = np.random.default_rng(0)
+    x = rng.standard_normal((4, 3, 50))
+    w = bootstrap_weights(5, 50, random_state=0)
+    assert (w.sum(-1) == 50).all()
+
+    c = cov_gauss_weighted_nd(x, w)
+    assert c.shape == (4, 5, 3, 3)
+    for b in range(5):
+        x_b = np.repeat(x, w[b], axis=-1)
+        c_ref = np.stack([np.cov(x_b[k]) for k in range(4)])
+        np.testing.assert_array_almost_equal(c[:, b], c_ref)
+
+    # unit weights of demeaned data give the covariance
+    x -= x.mean(-1, keepdims=True)
+    np.testing.assert_array_almost_equal(
+        cov_gauss_weighted_nd(x, np.ones((1, 50)))[:, 0], cov_gauss_nd(x))
+
+    # confidence interval of the entropy
+    ci = entropy_gauss_boot_nd(x, n_boot=200, random_state=0)
+    assert ci.shape == (2, 4)
+    h = entropy_gauss_nd(x)
+    assert ((ci[0] <= h) & (h <= ci[1])).all()
+
+    # the same interval is obtained in batches of resamples
+    np.testing.assert_array_almost_equal(entropy_gauss_boot_nd(
+        x, n_boot=200, max_memory=1, random_state=0), ci)
+
+
+def test_cov_gauss_cross_nd():
+    """Test the cross-covariances with shared vectors."""
+    rng = np.random.default_rng(0)
+    x = rng.standard_normal((4, 3, 600))
+    y = rng.standard_normal((600, 2))
+    c = cov_gauss_nd(np.concatenate((x, np.broadcast_to(
+        y.T, (4, 2, 600))), axis=1))
+    np.testing.assert_array_almost_equal(cov_gauss_cross_nd(x, y),
+                                         c[:, :3, 3:])
+    np.testing.assert_array_almost_equal(cov_gauss_cross_nd(x, y[:, 0]),
+                                         c[:, :3, 3])
+    # single precision blocks accumulated in double precision
+    c_32 = cov_gauss_cross_nd(x.astype(np.float32), y.astype(np.float32))
+    assert c_32.dtype == np.float64
+    np.testing.assert_allclose(c_32, c[:, :3, 3:], atol=1e-6)